@@ -0,0 +1,302 @@
+import numpy as np
+
+from student_dataset import missing_score, present_scores
+
+# Scores are whole numbers from 0 to 100, so one histogram bin per score value
+# keeps every distribution exactly and can be re-binned for any chart
+score_values = 101
+
+# Cells reserved up front; the arrays double whenever they run out
+initial_cells = 64
+
+# Quantiles shown by the subject and grade reports: quartiles and the median
+report_quantiles = (0.25, 0.5, 0.75)
+
+
+# Function to read quantiles off a histogram of value counts, using the inverted
+# CDF definition (numpy's method="inverted_cdf"): the smallest value with at least
+# a q share of the counts at or below it. The store's histograms have a bin for
+# every score a student can get, so merging them loses nothing and the quantiles
+# are exact, with no rank error, unlike a t-digest or KLL sketch.
+def histogram_quantiles(values, counts, quantiles=report_quantiles):
+    cumulative = np.cumsum(counts)
+    targets = np.maximum(np.asarray(quantiles) * cumulative[-1], 1)
+    return values[np.searchsorted(cumulative, targets, side="left")]
+
+
+# Function to summarise a histogram of score counts: the number of students and
+# their average, standard deviation, minimum, maximum and quartiles. The average
+# comes from the exact integer total, so every backend that counts the same
+# scores gets the same figures to the last bit.
+def histogram_summary(values, counts):
+    students = int(counts.sum())
+    present = np.flatnonzero(counts)
+    average = int(values @ counts) / students
+    return {
+        "students": students,
+        "average": average,
+        "std": float(np.sqrt((values - average) ** 2 @ counts / students)),
+        "min": int(values[present[0]]),
+        "max": int(values[present[-1]]),
+        "quartiles": histogram_quantiles(values, counts).tolist(),
+    }
+
+
+# Function to find the bin of an overall-score histogram counting students with
+# the given score totals and numbers of subjects scored (at least one). There is
+# a bin for every (subjects scored, total) pair, so each student's overall score,
+# total / subjects scored, is kept exactly whichever subjects they have scores in.
+def overall_bins(totals, counts, subject_count):
+    return (counts - 1) * (100 * subject_count + 1) + totals
+
+
+# Function to get the subjects scored and the score total of every overall-score bin
+def overall_bin_values(subject_count):
+    counts, totals = np.divmod(np.arange(subject_count * (100 * subject_count + 1)), 100 * subject_count + 1)
+    return counts + 1, totals
+
+
+# Function to average overall scores from the summed score totals of the
+# students scoring each number of subjects (index 0 counting none). The sums
+# are exact integers, so every backend that counts the same scores gets the
+# same average to the last bit.
+def overall_average(count_totals, students):
+    return float((count_totals[1:] / np.arange(1, len(count_totals))).sum() / students)
+
+
+# Function to summarise an overall-score histogram (see overall_bins) per grade,
+# with the scores sorted and the average taken from the exact totals. Returns
+# None for an empty histogram, as when nobody in the grade has a score.
+def overall_summary(counts, subject_count):
+    students = int(counts.sum())
+    if students == 0:
+        return None
+    scored, totals = overall_bin_values(subject_count)
+    overall = (totals / scored).astype(np.float32)
+    order = np.argsort(overall, kind="stable")
+    values, weights = overall[order], counts[order]
+    present = np.flatnonzero(weights)
+    return {
+        "scores": values,
+        "weights": weights,
+        "quartiles": histogram_quantiles(values, weights).tolist(),
+        "students": students,
+        "average": overall_average(np.bincount(scored, weights=totals * counts, minlength=subject_count + 1), students),
+        "min": float(values[present[0]]),
+        "max": float(values[present[-1]]),
+    }
+
+
+# Function to get the percentile rank of a value within a histogram: the share of
+# counts below it, counting ties as half, as the Grade Percentile column does
+def histogram_percentile(values, counts, value):
+    below = counts[values < value].sum()
+    tied = counts[values == value].sum()
+    return float(100 * (below + tied / 2) / counts.sum())
+
+
+# Running statistics per (School, Grade, Term) cell and subject: counts, sums,
+# Welford mean and M2 for the variance, min/max and per-score histograms, plus a
+# histogram of each cell's overall scores. Missing scores are left out, so each
+# subject counts the students scored in it. Adding a batch of students only
+# touches the cells that batch falls in.
+#
+# The overall histograms have a bin for every (subjects scored, total) pair, far
+# more than a cell's students reach, so they are kept sparse: the sorted keys
+# cell * overall bins + bin of the bins in use, and their counts.
+class AggregateStore:
+    def __init__(self, subjects):
+        self.subjects = list(subjects)
+        self.cells = {}
+        self.size = 0
+        self.allocate(initial_cells)
+        subject_count = len(self.subjects)
+        self.overall_bin_count = subject_count * (100 * subject_count + 1)
+        self.overall_keys = np.zeros(0, dtype=np.int64)
+        self.overall_counts = np.zeros(0, dtype=np.int64)
+
+    def __len__(self):
+        return self.size
+
+    # Function to (re)allocate the per-cell arrays, keeping the cells filled so far
+    def allocate(self, capacity):
+        subject_count = len(self.subjects)
+        arrays = {
+            "cell_schools": np.empty(capacity, dtype=object),
+            "cell_grades": np.zeros(capacity, dtype=np.uint8),
+            "cell_terms": np.zeros(capacity, dtype=np.uint8),
+            "count": np.zeros(capacity, dtype=np.int64),
+            "scored": np.zeros((capacity, subject_count), dtype=np.int64),
+            "total": np.zeros((capacity, subject_count)),
+            "mean": np.zeros((capacity, subject_count)),
+            "m2": np.zeros((capacity, subject_count)),
+            "minimum": np.full((capacity, subject_count), 255, dtype=np.uint8),
+            "maximum": np.zeros((capacity, subject_count), dtype=np.uint8),
+            "histogram": np.zeros((capacity, subject_count, score_values), dtype=np.int32),
+        }
+        for name, array in arrays.items():
+            if self.size:
+                array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+
+    # Function to find the store cell of every (school, grade, term) in a batch,
+    # creating the cells seen for the first time
+    def cell_indices(self, schools, grades, terms):
+        indices = np.empty(len(schools), dtype=np.int64)
+        for i, key in enumerate(zip(schools, grades.tolist(), terms.tolist())):
+            if key not in self.cells:
+                if self.size == len(self.count):
+                    self.allocate(2 * len(self.count))
+                self.cells[key] = self.size
+                self.cell_schools[self.size], self.cell_grades[self.size], self.cell_terms[self.size] = key
+                self.size += 1
+            indices[i] = self.cells[key]
+        return indices
+
+    # Function to fold a batch of students into the store
+    def add(self, dataset):
+        if len(dataset) == 0:
+            return self
+        scores = dataset.scores
+        present = present_scores(scores)
+        subject_count = len(self.subjects)
+
+        # Group the batch by cell; the number of distinct cells is small
+        grades, terms = dataset.columns["Grade"], dataset.columns["Term"]
+        keys = (dataset.school_codes.astype(np.int64) * 256 + grades) * 256 + terms
+        unique_keys, local = np.unique(keys, return_inverse=True)
+        cells = self.cell_indices(
+            [str(school) for school in dataset.school_names[unique_keys // 65536]],
+            (unique_keys // 256 % 256).astype(np.uint8),
+            (unique_keys % 256).astype(np.uint8),
+        )
+        cell_count = len(cells)
+
+        # Batch statistics per cell over each subject's present scores, then
+        # merged into the running ones (Chan et al.)
+        batch_scored = np.empty((cell_count, subject_count), dtype=np.int64)
+        batch_total = np.empty((cell_count, subject_count))
+        batch_m2 = np.empty((cell_count, subject_count))
+        for j in range(subject_count):
+            scored_local = local[present[:, j]]
+            values = scores[present[:, j], j]
+            batch_scored[:, j] = np.bincount(scored_local, minlength=cell_count)
+            batch_total[:, j] = np.bincount(scored_local, weights=values, minlength=cell_count)
+            batch_mean = batch_total[:, j] / np.maximum(batch_scored[:, j], 1)
+            batch_m2[:, j] = np.bincount(scored_local, weights=(values - batch_mean[scored_local]) ** 2, minlength=cell_count)
+            np.minimum.at(self.minimum[:, j], cells[scored_local], values)
+            np.maximum.at(self.maximum[:, j], cells[scored_local], values)
+
+        old_scored = self.scored[cells]
+        new_scored = old_scored + batch_scored
+        batch_mean = batch_total / np.maximum(batch_scored, 1)
+        delta = batch_mean - self.mean[cells]
+        weight = batch_scored / np.maximum(new_scored, 1)
+        self.mean[cells] += delta * weight
+        self.m2[cells] += batch_m2 + delta ** 2 * old_scored * weight
+        self.total[cells] += batch_total
+        self.scored[cells] = new_scored
+        self.count[cells] += np.bincount(local, minlength=cell_count)
+
+        # Histograms: one bincount over (cell, subject, score) for the present
+        # subject scores, and the overall scores of the students with any score
+        # counted into the sparse overall histograms
+        positions = (local[:, None] * subject_count + np.arange(subject_count)) * score_values + scores
+        counts = np.bincount(positions[present], minlength=cell_count * subject_count * score_values)
+        self.histogram[cells] += counts.reshape(cell_count, subject_count, score_values).astype(np.int32)
+        totals, scored = dataset.score_totals()
+        ranked = scored > 0
+        bins = overall_bins(totals[ranked], scored[ranked], subject_count)
+        self.add_overall(cells[local[ranked]] * self.overall_bin_count + bins)
+        return self
+
+    # Function to count overall scores, given by their keys, into the sparse
+    # overall histograms: bins already in use are incremented in place and new
+    # ones inserted at their sorted positions
+    def add_overall(self, keys):
+        keys, counts = np.unique(keys, return_counts=True)
+        positions = np.searchsorted(self.overall_keys, keys)
+        found = positions < len(self.overall_keys)
+        found[found] = self.overall_keys[positions[found]] == keys[found]
+        self.overall_counts[positions[found]] += counts[found]
+        self.overall_keys = np.insert(self.overall_keys, positions[~found], keys[~found])
+        self.overall_counts = np.insert(self.overall_counts, positions[~found], counts[~found])
+
+    # Function to select the non-empty cells matching a school, a grade range and a set of terms
+    def select(self, school=None, min_grade=None, max_grade=None, terms=None):
+        mask = self.count[:self.size] > 0
+        if school is not None and school != "All":
+            mask &= self.cell_schools[:self.size] == school
+        if min_grade is not None:
+            mask &= self.cell_grades[:self.size] >= min_grade
+        if max_grade is not None:
+            mask &= self.cell_grades[:self.size] <= max_grade
+        if terms is not None:
+            mask &= np.isin(self.cell_terms[:self.size], list(terms))
+        return np.flatnonzero(mask)
+
+    # Function to merge the statistics of a set of cells for every subject,
+    # returning the students scored, the mean and M2 of each
+    def merged_moments(self, cells):
+        scored = self.scored[cells]
+        students = scored.sum(axis=0)
+        mean = self.total[cells].sum(axis=0) / np.maximum(students, 1)
+        m2 = (self.m2[cells] + scored * (self.mean[cells] - mean) ** 2).sum(axis=0)
+        return students, mean, m2
+
+    # Function to compute per-subject score statistics over a set of cells, in the
+    # shape of reports.compute_subject_analysis with the histogram given as the
+    # score values and their counts. Subjects nobody has a score in are left out.
+    def subject_analysis(self, cells=None):
+        cells = self.select() if cells is None else cells
+        if len(cells) == 0:
+            return {}
+        students, mean, m2 = self.merged_moments(cells)
+        histogram = self.histogram[cells].sum(axis=0)
+        values = np.arange(score_values)
+        return {
+            subject: {
+                "scores": values,
+                "weights": histogram[j],
+                "quartiles": histogram_quantiles(values, histogram[j]).tolist(),
+                "students": int(students[j]),
+                "average": float(mean[j]),
+                "std": float(np.sqrt(m2[j] / students[j])),
+                "min": int(self.minimum[cells, j].min()),
+                "max": int(self.maximum[cells, j].max()),
+            }
+            for j, subject in enumerate(self.subjects)
+            if students[j]
+        }
+
+    # Function to compute overall score statistics per grade over a set of cells,
+    # with the histogram given as the overall score values and their counts.
+    # Grades where nobody has a score are left out, as GradeRanking does.
+    def grade_comparison(self, cells=None):
+        cells = self.select() if cells is None else cells
+        key_cells, key_bins = np.divmod(self.overall_keys, self.overall_bin_count)
+        selected = np.isin(key_cells, cells)
+        key_grades = self.cell_grades[key_cells]
+        grade_data = {}
+        for grade in np.unique(self.cell_grades[cells]).tolist():
+            keys = selected & (key_grades == grade)
+            counts = np.bincount(key_bins[keys], weights=self.overall_counts[keys], minlength=self.overall_bin_count)
+            summary = overall_summary(counts.astype(np.int64), len(self.subjects))
+            if summary is not None:
+                grade_data[grade] = summary
+        return grade_data
+
+    # Function to get the percentile rank of each of a student's subject scores
+    # among the students in a set of cells, None for a missing score
+    def subject_percentiles(self, cells, scores):
+        histogram = self.histogram[cells].sum(axis=0)
+        values = np.arange(score_values)
+        return {
+            subject: None if score == missing_score else histogram_percentile(values, histogram[j], score)
+            for j, (subject, score) in enumerate(zip(self.subjects, scores))
+        }
+
+
+# Function to build an aggregate store over a whole dataset
+def build_aggregate_store(dataset):
+    return AggregateStore(dataset.subjects).add(dataset)
@@ -0,0 +1,169 @@
+import argparse
+import html
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import dataset_cache
+from charts import bin_counts, binned_histogram_figure
+from csv_ingest import csv_files, load_csvs
+from csv_schema import ValidationErrors
+from reports import compute_subject_analysis, compute_pathway_analysis, compute_grade_comparison, group_rows, pathway_thresholds, pathways, subjects
+
+# Dataset opened by each worker process from the on-disk cache
+worker_dataset = None
+
+
+# Function run once in each worker to memory-map the shared dataset
+def open_worker_dataset(key, cache_dir):
+    global worker_dataset
+    worker_dataset = dataset_cache.load_cached_dataset(key, cache_dir)
+
+
+# Function to turn a school name into a file name
+def school_file_name(code, school):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", str(school)).strip("-").lower() or "unnamed"
+    return f"{code:05d}-{slug}"
+
+
+# Function to compute the Subject, Pathway and Grade reports for one set of students
+def school_report(dataset, school):
+    names = dataset.names
+    subject_data = compute_subject_analysis(dataset)
+    report = {"school": school, "students": len(dataset), "subjects": {}, "pathways": {}, "grades": {}}
+    for subject, summary in subject_data.items():
+        counts, edges = bin_counts(summary["scores"])
+        report["subjects"][subject] = {
+            "average": summary["average"],
+            "min": summary["min"],
+            "max": summary["max"],
+            "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+        }
+    for pathway, rows in compute_pathway_analysis(dataset, pathways, pathway_thresholds).items():
+        report["pathways"][pathway] = {"students": len(rows), "names": [str(names[row]) for row in rows]}
+    for grade, summary in compute_grade_comparison(dataset).items():
+        counts, edges = bin_counts(summary["scores"])
+        report["grades"][str(grade)] = {
+            "students": len(summary["rows"]),
+            "average": summary["average"],
+            "min": summary["min"],
+            "max": summary["max"],
+            "histogram": {"counts": counts.tolist(), "edges": edges.tolist()},
+            "at_risk": [str(names[row]) for row in summary["at_risk"]],
+            "excelling": [str(names[row]) for row in summary["excelling"]],
+        }
+    return report
+
+
+# Function to render a school report as a static HTML page
+def report_html(report):
+    figures = []
+
+    def figure_html(histogram, title, xaxis_title):
+        fig = binned_histogram_figure(histogram["counts"], histogram["edges"], title, xaxis_title)
+        figures.append(fig)
+        # Only the first figure on the page loads plotly.js
+        return fig.to_html(full_html=False, include_plotlyjs="cdn" if len(figures) == 1 else False)
+
+    school = html.escape(str(report["school"]))
+    parts = [f"<h1>{school}</h1>", f"<p>{report['students']:,} students</p>", "<h2>Subject Analysis</h2>"]
+    for subject, summary in report["subjects"].items():
+        parts.append(f"<h3>{html.escape(subject)}</h3>")
+        parts.append(f"<p>Average {summary['average']:.2f}, minimum {summary['min']}, maximum {summary['max']}</p>")
+        parts.append(figure_html(summary["histogram"], f"{subject} Score Distribution", "Score"))
+
+    parts.append("<h2>Pathway Analysis</h2><ul>")
+    for pathway, summary in report["pathways"].items():
+        parts.append(f"<li>{html.escape(pathway)}: {summary['students']:,} students</li>")
+    parts.append("</ul>")
+
+    parts.append("<h2>Grade Comparison</h2>")
+    for grade, summary in report["grades"].items():
+        parts.append(f"<h3>Grade {grade}</h3>")
+        parts.append(
+            f"<p>Average {summary['average']:.2f}, minimum {summary['min']:.2f}, maximum {summary['max']:.2f}; "
+            f"{len(summary['at_risk']):,} at risk, {len(summary['excelling']):,} excelling</p>"
+        )
+        parts.append(figure_html(summary["histogram"], f"Grade {grade} Score Distribution", "Overall Score"))
+
+    body = "\n".join(parts)
+    return f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{school}</title></head><body>\n{body}\n</body></html>\n"
+
+
+# Function run in a worker: build and write the reports for one school
+def write_school_report(task):
+    code, school, rows, output_dir, formats = task
+    dataset = worker_dataset.take(rows)
+    report = school_report(dataset, school)
+    file_name = school_file_name(code, school)
+    if "json" in formats:
+        with open(os.path.join(output_dir, f"{file_name}.json"), "w") as output:
+            json.dump(report, output)
+    if "html" in formats:
+        with open(os.path.join(output_dir, f"{file_name}.html"), "w", encoding="utf-8") as output:
+            output.write(report_html(report))
+    return {"school": school, "students": report["students"], "file": file_name}
+
+
+# Function to write every school's reports using a pool of worker processes.
+# csv_path may be a single CSV file or a directory of them. Any problem cells
+# found in the CSVs are listed in validation_errors.csv next to the reports.
+def run_batch(csv_path, output_dir, workers=None, formats=("html", "json"), progress=None):
+    sources = csv_files(csv_path) if os.path.isdir(csv_path) else [csv_path]
+    keys = [dataset_cache.content_hash(source, subjects) for source in sources]
+    key = keys[0] if len(keys) == 1 else dataset_cache.combined_hash(keys)
+    if dataset_cache.load_cached_dataset(key) is None:
+        errors = ValidationErrors()
+        dataset_cache.store_dataset(key, load_csvs(sources, subjects, errors=errors), errors=errors)
+    dataset = dataset_cache.load_cached_dataset(key)
+
+    os.makedirs(output_dir, exist_ok=True)
+    error_report = dataset_cache.load_cached_errors(key)[1]
+    if error_report is not None:
+        with open(os.path.join(output_dir, "validation_errors.csv"), "wb") as output:
+            output.write(error_report)
+    tasks = [
+        (code, str(dataset.school_names[code]), rows, output_dir, tuple(formats))
+        for code, rows in group_rows(dataset.school_codes).items()
+    ]
+    # Largest schools first, so no worker is left with a big one at the end
+    tasks.sort(key=lambda task: len(task[2]), reverse=True)
+
+    index = []
+    with ProcessPoolExecutor(workers, initializer=open_worker_dataset, initargs=(key, dataset_cache.cache_dir)) as executor:
+        for entry in executor.map(write_school_report, tasks):
+            index.append(entry)
+            if progress is not None:
+                progress(len(index), len(tasks))
+
+    index.sort(key=lambda entry: entry["file"])
+    with open(os.path.join(output_dir, "index.json"), "w") as output:
+        json.dump(index, output, indent=2)
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write Subject, Pathway and Grade reports for every school in a CSV.")
+    parser.add_argument("csv", help="student CSV file, or a directory of them")
+    parser.add_argument("output", help="directory for the reports")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core)")
+    parser.add_argument("--format", nargs="+", choices=("html", "json"), default=["html", "json"])
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = run_batch(
+        args.csv,
+        args.output,
+        args.workers,
+        args.format,
+        progress=lambda done, total: print(f"\r{done}/{total} schools", end="", flush=True),
+    )
+    elapsed = time.perf_counter() - start
+    students = sum(entry["students"] for entry in index)
+    print(f"\nWrote reports for {len(index)} schools ({students:,} students) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
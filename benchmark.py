@@ -0,0 +1,191 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+import plotly.graph_objects as go
+
+from aggregate_store import build_aggregate_store, report_quantiles
+from charts import figure_bytes, histogram_figure
+from student_dataset import StudentDataset
+from reports import compute_subject_analysis, compute_pathway_analysis, compute_grade_comparison, pathways, subjects
+
+
+# Function to generate random students in the list-of-dicts format
+def generate_students(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "Name": f"Student {i}",
+            "Subjects": {subject: rng.randint(50, 100) for subject in subjects},
+            "Age": rng.randint(12, 18),
+            "Grade": rng.randint(8, 12),
+            "Term": rng.randint(1, 3),
+            "Class": rng.randint(1, 5),
+            "School": f"School {rng.randint(1, 50)}",
+        }
+        for i in range(count)
+    ]
+
+
+# Dict-based report computations, as the reports did them before the columnar dataset
+def dict_subject_analysis(students):
+    subject_data = {subject: [] for subject in subjects}
+    for student in students:
+        for subject, score in student["Subjects"].items():
+            subject_data[subject].append(score)
+    return {
+        subject: (sum(scores) / len(scores), min(scores), max(scores))
+        for subject, scores in subject_data.items()
+    }
+
+
+def dict_pathway_analysis(students):
+    pathway_data = {pathway: [] for pathway in pathways}
+    for student in students:
+        student_subjects = set(subject for subject, score in student["Subjects"].items() if score >= 70)
+        for pathway, required_subjects in pathways.items():
+            if set(required_subjects).issubset(student_subjects):
+                pathway_data[pathway].append(student)
+    return pathway_data
+
+
+def dict_grade_comparison(students):
+    grade_data = {}
+    for student in students:
+        grade_data.setdefault(student["Grade"], []).append(student)
+    results = {}
+    for grade, students_in_grade in grade_data.items():
+        student_scores = [sum(student["Subjects"].values()) / len(subjects) for student in students_in_grade]
+        at_risk = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) < 60]
+        excelling = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) >= 90]
+        results[grade] = (sum(student_scores) / len(student_scores), min(student_scores), max(student_scores), at_risk, excelling)
+    return results
+
+
+# Function to time a callable, keeping the best of several runs
+def best_time(function, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Function to time the subject and grade statistics after a new batch of students
+# arrives: rescanning the combined dataset versus folding the batch into the store
+def appended_batch_times(dataset, batch):
+    combined = dataset.append(batch)
+    store = build_aggregate_store(dataset)
+
+    def rescan():
+        compute_subject_analysis(combined)
+        compute_grade_comparison(combined)
+
+    # Each repeat adds the batch again; the cost does not depend on how often it was added
+    def incremental():
+        store.add(batch)
+        store.subject_analysis()
+        store.grade_comparison()
+
+    return best_time(rescan), best_time(incremental)
+
+
+# Function to time subject quartiles for one school and grade range: selecting the
+# students and computing exact quantiles versus merging the store's histograms
+def quantile_times(dataset, store):
+    school = str(dataset.school_names[0])
+
+    def exact():
+        rows = (dataset.school_codes == 0) & (dataset.columns["Grade"] >= 9) & (dataset.columns["Grade"] <= 11)
+        np.quantile(dataset.scores[rows], report_quantiles, axis=0, method="inverted_cdf")
+
+    def merged():
+        store.subject_analysis(store.select(school, 9, 11))
+
+    def exact_all():
+        np.quantile(dataset.scores, report_quantiles, axis=0, method="inverted_cdf")
+
+    def merged_all():
+        store.subject_analysis()
+
+    return best_time(exact), best_time(merged), best_time(exact_all), best_time(merged_all)
+
+
+# Function to total the bytes sent for the subject and grade histograms, with raw
+# scores shipped to go.Histogram versus counts binned on the server
+def histogram_payloads(dataset):
+    distributions = [summary["scores"] for summary in compute_subject_analysis(dataset).values()]
+    distributions += [summary["scores"] for summary in compute_grade_comparison(dataset).values()]
+    raw = sum(figure_bytes(go.Figure(data=[go.Histogram(x=scores, nbinsx=10)])) for scores in distributions)
+    binned = sum(figure_bytes(histogram_figure(scores, "", "")) for scores in distributions)
+    return raw, binned
+
+
+# Function to measure the bytes held per student by the list-of-dicts format, as
+# traced while generating it, and by the columnar dataset built from it
+def memory_per_student(count):
+    tracemalloc.start()
+    students = generate_students(count)
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    dataset = StudentDataset.from_records(students, subjects)
+    return dict_bytes / count, sum(dataset.memory_usage().values()) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dict-based and columnar report computation.")
+    parser.add_argument("--students", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'report':<20}{'students':>10}{'dicts (s)':>12}{'columnar (s)':>14}{'speedup':>10}")
+    for count in args.students:
+        students = generate_students(count)
+        dataset = StudentDataset.from_records(students, subjects)
+
+        cases = [
+            ("subject analysis", dict_subject_analysis, compute_subject_analysis, ()),
+            ("pathway analysis", dict_pathway_analysis, compute_pathway_analysis, (pathways,)),
+            ("grade comparison", dict_grade_comparison, compute_grade_comparison, ()),
+        ]
+        for name, dict_function, columnar_function, extra in cases:
+            dict_time = best_time(dict_function, students)
+            columnar_time = best_time(columnar_function, dataset, *extra)
+            print(f"{name:<20}{count:>10}{dict_time:>12.4f}{columnar_time:>14.4f}{dict_time / columnar_time:>9.1f}x")
+
+    print()
+    print(f"{'histogram payload':<20}{'students':>10}{'raw (B)':>14}{'binned (B)':>12}")
+    for count in args.students:
+        dataset = StudentDataset.from_records(generate_students(count), subjects)
+        raw, binned = histogram_payloads(dataset)
+        print(f"{'all histograms':<20}{count:>10}{raw:>14,}{binned:>12,}")
+
+    print()
+    print(f"{'appended batch':<20}{'students':>10}{'rescan (s)':>12}{'append (s)':>14}{'speedup':>10}")
+    for count in args.students:
+        dataset = StudentDataset.from_records(generate_students(count), subjects)
+        batch = StudentDataset.from_records(generate_students(max(count // 10, 1), seed=1), subjects)
+        rescan_time, append_time = appended_batch_times(dataset, batch)
+        print(f"{'+10% students':<20}{count:>10}{rescan_time:>12.4f}{append_time:>14.4f}{rescan_time / append_time:>9.1f}x")
+
+    print()
+    print(f"{'quartiles':<20}{'students':>10}{'exact (s)':>12}{'merged (s)':>14}{'speedup':>10}")
+    for count in args.students:
+        dataset = StudentDataset.from_records(generate_students(count), subjects)
+        store = build_aggregate_store(dataset)
+        exact_time, merged_time, exact_all_time, merged_all_time = quantile_times(dataset, store)
+        print(f"{'one school':<20}{count:>10}{exact_time:>12.4f}{merged_time:>14.4f}{exact_time / merged_time:>9.1f}x")
+        print(f"{'all students':<20}{count:>10}{exact_all_time:>12.4f}{merged_all_time:>14.4f}{exact_all_time / merged_all_time:>9.1f}x")
+
+    print()
+    print(f"{'memory per student':<20}{'students':>10}{'dicts (B)':>12}{'columnar (B)':>14}{'saving':>10}")
+    for count in args.students:
+        dict_bytes, columnar_bytes = memory_per_student(count)
+        print(f"{'all fields':<20}{count:>10}{dict_bytes:>12.1f}{columnar_bytes:>14.1f}{dict_bytes / columnar_bytes:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+from student_dataset import float_scores
+
+# Number of bins used for score distributions
+histogram_bins = 10
+
+# Radial axis range shared by all radar charts
+radar_range = [50, 100]
+
+# Columns in a small-multiples radar grid
+radar_grid_columns = 4
+
+
+# Function to count values into equal-width bins, returning the counts and bin edges.
+# With weights, each value is counted that many times (values with weight 0 are
+# left out of the range), so pre-counted distributions bin like the raw values.
+def bin_counts(values, bins=histogram_bins, value_range=None, weights=None):
+    values = np.asarray(values)
+    present = values if weights is None else values[np.asarray(weights) > 0]
+    if value_range is None and len(present):
+        value_range = (float(present.min()), float(present.max()))
+        if value_range[0] == value_range[1]:
+            value_range = (value_range[0] - 0.5, value_range[1] + 0.5)
+    return np.histogram(values, bins=bins, range=value_range, weights=weights)
+
+
+# Function to build a histogram figure from counts binned on the server, so the
+# figure holds one bar per bin rather than one value per student
+def histogram_figure(values, title, xaxis_title, bins=histogram_bins, value_range=None, weights=None):
+    counts, edges = bin_counts(values, bins, value_range, weights)
+    return binned_histogram_figure(counts, edges, title, xaxis_title)
+
+
+# Function to build a histogram figure from existing bin counts and edges
+def binned_histogram_figure(counts, edges, title, xaxis_title):
+    edges = np.asarray(edges)
+    fig = go.Figure(data=[go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts,
+        width=np.diff(edges),
+        customdata=np.column_stack([edges[:-1], edges[1:]]),
+        hovertemplate="%{customdata[0]:.1f} - %{customdata[1]:.1f}<br>Count: %{y}<extra></extra>",
+    )])
+    fig.update_layout(
+        title=title,
+        xaxis_title=xaxis_title,
+        yaxis_title="Count",
+        bargap=0,
+    )
+    return fig
+
+
+# Function to summarise a cohort's scores as a per-subject mean and percentile
+# band, over the present scores of each subject
+def reference_band(scores, low=25, high=75):
+    if len(scores) == 0:
+        return None
+    scores = float_scores(scores)
+    low_values, high_values = np.nanpercentile(scores, [low, high], axis=0)
+    return {
+        "mean": np.nanmean(scores, axis=0),
+        "low": low_values,
+        "high": high_values,
+        "label": f"{low}th-{high}th percentile",
+    }
+
+
+# Function to build the polar traces drawing a reference band: the band between
+# the low and high percentiles, and the cohort mean as a dashed line
+def reference_traces(reference, subjects, showlegend=True):
+    theta = list(subjects) + list(subjects[:1])
+
+    def closed(values):
+        return list(values) + list(values[:1])
+
+    return [
+        go.Scatterpolar(r=closed(reference["high"]), theta=theta, mode="lines", line=dict(width=0),
+                        showlegend=False, hoverinfo="skip", legendgroup="band"),
+        go.Scatterpolar(r=closed(reference["low"]), theta=theta, mode="lines", line=dict(width=0),
+                        fill="tonext", fillcolor="rgba(128, 128, 128, 0.25)", name=reference["label"],
+                        showlegend=showlegend, legendgroup="band"),
+        go.Scatterpolar(r=closed(reference["mean"]), theta=theta, mode="lines", line=dict(dash="dash", color="gray"),
+                        name="Cohort mean", showlegend=showlegend, legendgroup="mean"),
+    ]
+
+
+# Function to build the radar chart of one student record, over the cohort's
+# reference band when given. Subjects without a score are left as gaps.
+def radar_figure(student, subjects, title, reference=None):
+    fig = go.Figure()
+
+    # Overlay the cohort mean and percentile band behind the student
+    if reference is not None:
+        fig.add_traces(reference_traces(reference, subjects))
+
+    fig.add_trace(go.Scatterpolar(
+        r=[student["Subjects"].get(subject) for subject in subjects],
+        theta=subjects,
+        fill="toself",
+        name=student["Name"],
+    ))
+
+    fig.update_layout(
+        polar=dict(radialaxis=dict(visible=True, range=radar_range)),
+        showlegend=True,
+        title=title,
+        height=600,
+        width=800,
+    )
+    return fig
+
+
+# Function to build one figure holding a small radar chart for each given student
+def radar_grid_figure(dataset, rows, reference=None, columns=radar_grid_columns):
+    grid_rows = max(1, -(-len(rows) // columns))
+    fig = make_subplots(
+        rows=grid_rows,
+        cols=columns,
+        specs=[[{"type": "polar"}] * columns] * grid_rows,
+        subplot_titles=[str(dataset.names[row]) for row in rows],
+        vertical_spacing=0.3 / grid_rows,
+    )
+    for i, row in enumerate(rows):
+        position = dict(row=i // columns + 1, col=i % columns + 1)
+        if reference is not None:
+            for trace in reference_traces(reference, dataset.subjects, showlegend=i == 0):
+                fig.add_trace(trace, **position)
+        fig.add_trace(go.Scatterpolar(
+            r=float_scores(dataset.scores[row]),
+            theta=dataset.subjects,
+            fill="toself",
+            name=str(dataset.names[row]),
+            showlegend=False,
+        ), **position)
+
+    fig.update_polars(
+        radialaxis=dict(visible=True, range=radar_range, showticklabels=False),
+        angularaxis=dict(showticklabels=False),
+    )
+    fig.update_annotations(font_size=11)
+    fig.update_layout(height=250 * grid_rows, margin=dict(t=40, b=20))
+    return fig
+
+
+# Function to measure how many bytes a figure sends to the browser
+def figure_bytes(fig):
+    return len(fig.to_json().encode())
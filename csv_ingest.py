@@ -0,0 +1,236 @@
+import io
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from csv_schema import LongPivot, ValidationErrors, check_columns, is_long_format, long_rows, map_wide
+from student_dataset import StudentDataset, StudentDatasetBuilder, info_columns
+from student_timeline import deduplicate
+
+# Rows parsed per chunk when streaming a CSV file
+chunk_rows = 100_000
+
+
+# Function to build the explicit column dtypes used when parsing a student CSV,
+# in the wide or the long layout. Numbers are parsed as float32 so blanks can be
+# read as NaN (pandas' nullable UInt8 parser is several times slower), then
+# stored as uint8 by the builder; with text=True they are read as text instead,
+# for files with cells that are not numbers. Names are read as Python strings,
+# which is what the name packer and the long-layout grouping work on; pandas'
+# Arrow-backed str columns are slower to build and to convert.
+def csv_dtypes(subjects, long_format=False, text=False):
+    number = "object" if text else "float32"
+    dtypes = {"Name": "object", "School": "category"}
+    dtypes.update({column: number for column in info_columns})
+    if long_format:
+        # Grouped by value across the whole file, where Python strings factorize fastest
+        dtypes.update({"School": "object", "Subject": "object", "Score": number})
+    else:
+        dtypes.update({subject: number for subject in subjects})
+    return dtypes
+
+
+# Function to open a CSV given as a path, or use an already open file as it is
+@contextmanager
+def opened(source):
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as stream:
+            yield stream
+    else:
+        yield source
+
+
+# Function to get the name a CSV is listed under in the error report
+def source_name(source):
+    return str(source) if isinstance(source, (str, os.PathLike)) else getattr(source, "name", "")
+
+
+# Function to read up to count rows of a CSV from the current position as bytes.
+# A row runs over several lines while one of its quoted fields is open, so the
+# lines are only checked one by one when they hold quotes.
+def read_rows(stream, count):
+    parts = []
+    quoted = False
+    while count > 0:
+        lines = list(itertools.islice(stream, count))
+        if not lines:
+            break
+        data = b"".join(lines)
+        parts.append(data)
+        if not quoted and b'"' not in data:
+            count -= len(lines)
+            continue
+        for line in lines:
+            quoted ^= line.count(b'"') % 2 == 1
+            count -= not quoted
+    return b"".join(parts)
+
+
+# Function to find the rows of a chunk read from blank lines: every cell empty,
+# or only whitespace in the first one, which a line of spaces is read into
+def blank_rows(chunk):
+    blank = chunk.iloc[:, -1].isna().to_numpy()
+    if not blank.any():
+        return blank
+    blank = blank & chunk.iloc[:, 1:].isna().all(axis=1).to_numpy()
+    first = chunk.iloc[blank, 0]
+    blank[blank] = first.isna().to_numpy() | first.astype(str).str.strip().eq("").to_numpy()
+    return blank
+
+
+# Function to number the rows of a chunk starting after the rows read before it,
+# counting the header line, and drop the blank ones. Returns (lines, chunk).
+def without_blank_rows(rows, chunk):
+    lines = rows + 2 + np.arange(len(chunk))
+    blank = blank_rows(chunk)
+    if blank.any():
+        return lines[~blank], chunk[~blank]
+    return lines, chunk
+
+
+# Function to read a CSV in chunks with its numbers parsed as float32. Should a
+# cell of a chunk fail to parse, that chunk alone is read again with the
+# numbers as text, so the bad cells can be reported rather than abort the load,
+# and the float32 reader resumes after it. Blank lines are read as rows and
+# dropped here, so the rows pandas counts are the file's lines, as read_rows
+# counts them. Yields the file line number of every row of a chunk with the chunk.
+def csv_chunks(stream, subjects, long_format, chunk_rows=chunk_rows):
+    stream.seek(0)
+    header = stream.readline()
+    columns = list(pd.read_csv(io.BytesIO(header)).columns)
+    rows = 0
+    # Byte offset the float32 reader starts from, and the rows before it
+    position, position_rows = stream.tell(), 0
+    while True:
+        dtypes = csv_dtypes(subjects, long_format)
+        stream.seek(position)
+        chunks = pd.read_csv(
+            stream, names=columns, header=None, dtype=dtypes,
+            usecols=lambda column: column in dtypes, chunksize=chunk_rows, skip_blank_lines=False,
+        )
+        try:
+            for chunk in chunks:
+                yield without_blank_rows(rows, chunk)
+                rows += len(chunk)
+            return
+        except ValueError:
+            pass
+
+        # Skip the rows read since the reader started, a chunk at a time, then
+        # read the failing chunk as text. A chunk of nothing but blank lines,
+        # which pandas cannot parse, is only counted.
+        stream.seek(position)
+        for skipped in range(position_rows, rows, chunk_rows):
+            read_rows(stream, min(chunk_rows, rows - skipped))
+        data = read_rows(stream, chunk_rows)
+        if data.strip():
+            dtypes = csv_dtypes(subjects, long_format, text=True)
+            chunk = pd.read_csv(
+                io.BytesIO(data), names=columns, header=None, dtype=dtypes,
+                usecols=lambda column: column in dtypes, skip_blank_lines=False,
+            )
+            yield without_blank_rows(rows, chunk)
+            rows += len(chunk)
+        else:
+            rows += data.count(b"\n") + (bool(data) and not data.endswith(b"\n"))
+        position, position_rows = stream.tell(), rows
+
+
+# Function to read a student CSV one validated chunk at a time, recording
+# problem cells in errors: frames in the wide layout, or for a file in the long
+# layout its validated rows (see csv_schema.long_rows). Returns whether the file
+# is in the long layout, and the chunks.
+def validated_chunks(stream, subjects, errors, file="", chunk_rows=chunk_rows):
+    stream.seek(0)
+    columns = pd.read_csv(stream, nrows=0).columns
+    long_format = is_long_format(columns)
+    check_columns(columns, subjects, errors, file)
+    validate = long_rows if long_format else map_wide
+    chunks = csv_chunks(stream, subjects, long_format, chunk_rows)
+    return long_format, (validate(chunk, subjects, errors, file, lines) for lines, chunk in chunks)
+
+
+# Function to read a student CSV in the wide or the long layout as validated
+# frames in the wide layout, recording problem cells in errors. Wide files are
+# read one chunk at a time. Long files are pivoted as each chunk is read, and
+# their students given once the whole file is read, since a student's rows may
+# be anywhere in it.
+def student_frames(stream, subjects, errors, file="", chunk_rows=chunk_rows):
+    long_format, chunks = validated_chunks(stream, subjects, errors, file, chunk_rows)
+    if not long_format:
+        yield from chunks
+        return
+    pivot = LongPivot(subjects)
+    for rows in chunks:
+        pivot.add(rows, errors, file)
+    yield from pivot.frames(chunk_rows)
+
+
+# Function to find the total size in bytes of an open file, if it can be measured
+def stream_size(stream):
+    size = getattr(stream, "size", None)
+    if size is None and stream.seekable():
+        position = stream.tell()
+        size = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+    return size
+
+
+# Function to stream a student CSV into a columnar dataset one chunk at a time.
+# Only the current chunk is held as a DataFrame, so peak memory is the compact
+# dataset plus a bounded multiple of one chunk, not the whole file. Problem
+# cells are read as blank and recorded in errors when it is given. progress is
+# called after every chunk with the rows read so far and the fraction of bytes
+# consumed (None when the size is unknown).
+def load_csv(source, subjects, chunk_rows=chunk_rows, progress=None, errors=None):
+    errors = ValidationErrors() if errors is None else errors
+    with opened(source) as stream:
+        total_bytes = stream_size(stream)
+        builder = StudentDatasetBuilder(subjects)
+        for frame in student_frames(stream, subjects, errors, source_name(source), chunk_rows):
+            builder.add_frame(frame)
+            if progress is not None:
+                fraction = min(stream.tell() / total_bytes, 1.0) if total_bytes else None
+                progress(len(builder), fraction)
+        return builder.build()
+
+
+# Function to list the CSV files under a directory, in a stable order
+def csv_files(directory):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+        if name.lower().endswith(".csv")
+    )
+
+
+# Function to load several student CSVs into one dataset, parsing them in a pool
+# of threads (pandas' parser releases the GIL, and threads share the results
+# without copying them between processes). A student seen in more than one file
+# for the same term keeps the row from the last of those files. progress is
+# called as each file finishes with the number of files done and the total.
+def load_csvs(sources, subjects, workers=None, progress=None, errors=None):
+    sources = list(sources)
+    file_errors = [ValidationErrors() for _ in sources]
+    with ThreadPoolExecutor(workers) as executor:
+        futures = {
+            executor.submit(load_csv, source, subjects, errors=file_errors[i]): i
+            for i, source in enumerate(sources)
+        }
+        datasets = [None] * len(sources)
+        for done, future in enumerate(as_completed(futures), 1):
+            datasets[futures[future]] = future.result()
+            if progress is not None:
+                progress(done, len(sources))
+    if errors is not None:
+        for found in file_errors:
+            errors.extend(found)
+    if len(datasets) == 1:
+        return datasets[0]
+    files = np.repeat(np.arange(len(datasets)), [len(dataset) for dataset in datasets])
+    return deduplicate(StudentDataset.concatenate(datasets), files)
@@ -1,168 +1,476 @@
+import os
 import random
+import numpy as np
 import plotly.graph_objects as go
 import streamlit as st
 import pandas as pd
-
-# Define the possible subjects
-subjects = ["English Language", "Social Studies", "Mathematics", "Integrated Science", "Zambian Languages", "Creative and Technology Studies"]
-
-# Define student pathways
-pathways = {
-    "STEM": ["Mathematics", "Integrated Science"],
-    "Humanities and Social Sciences": ["English Language", "Social Studies"],
-    "Linguistic and Cultural Studies": ["Zambian Languages", "English Language"],
-    "Creative and Design": ["Creative and Technology Studies"],
-}
-
-# Load student data from CSV
-@st.cache
-def load_student_data(file_path):
-    return pd.read_csv(file_path)
+from csv_ingest import csv_files, load_csv, load_csvs
+from dataset_cache import combined_hash, content_hash, load_cached_dataset, load_cached_errors, store_dataset
+from csv_schema import ValidationErrors
+from student_filter import FilterIndex
+from charts import histogram_figure
+from reports import compute_subject_analysis, compute_pathway_analysis, compute_grade_comparison, at_risk_score, excelling_score, pathway_thresholds, pathways, subjects
+from ranking import GradeRanking
+from aggregate_store import build_aggregate_store
+from student_timeline import StudentTimeline
+from student_database import StudentDatabase, build_database, database_path, quoted
+from report_store import ReportStore
+from dataset_registry import registry
+from student_table import DatabaseStudentTable, dataset_table, generate_radar_chart, generate_radar_drilldown, show_chart, show_student_table
+from student_dataset import float_scores
+from timing_spans import argument_rows, finish_run, profile_details, result_rows, start_run, timed, timing_log
+
+# Students listed at each end of a grade in the top and bottom view
+ranking_count = 5
+
+# Where the loaded students are kept. The SQLite database lives on disk, so
+# datasets larger than memory can be reported on; set SCHOLARSENSE_STORAGE=sqlite
+# to make it the default.
+storage_options = ("In memory", "SQLite on disk")
+default_storage = storage_options[1] if os.environ.get("SCHOLARSENSE_STORAGE") == "sqlite" else storage_options[0]
+
+# Most students fetched from the database for one radar drilldown
+database_list_limit = 1000
+
+# Function to get the content hash of an uploaded file or a file on disk, hashing
+# each file once per session (or again when a file on disk changes)
+def upload_key(source):
+    file_hashes = st.session_state.setdefault("file_hashes", {})
+    if isinstance(source, str):
+        file_id = (source, os.path.getmtime(source), os.path.getsize(source))
+    else:
+        file_id = source.file_id
+    if file_id not in file_hashes:
+        file_hashes[file_id] = content_hash(source, subjects)
+    return file_hashes[file_id]
+
+# Function to get the cache key of the dataset loaded from a list of files
+def dataset_key(sources):
+    keys = [upload_key(source) for source in sources]
+    return keys[0] if len(keys) == 1 else combined_hash(keys)
+
+# Load student data from one or more CSV files into a columnar dataset. A single
+# file is streamed in chunks; several are parsed concurrently and merged, with
+# repeated student terms taken from the last file. Files may have one column per
+# subject or one row per student and subject; problem cells are read as blank
+# and listed in a report kept with the dataset. Parsed datasets are cached on
+# disk by content hash and memory-mapped back in.
+@timed(result_rows)
+def load_student_data(sources):
+    key = dataset_key(sources)
+    dataset = load_cached_dataset(key)
+    if dataset is None:
+        progress_bar = st.progress(0.0, text="Loading student data...")
+
+        def show_progress(rows, fraction):
+            progress_bar.progress(fraction or 0.0, text=f"Loaded {rows:,} students")
+
+        def show_files(done, total):
+            progress_bar.progress(done / total, text=f"Loaded {done:,} of {total:,} files")
+
+        errors = ValidationErrors()
+        if len(sources) == 1:
+            dataset = load_csv(sources[0], subjects, progress=show_progress, errors=errors)
+        else:
+            dataset = load_csvs(sources, subjects, progress=show_files, errors=errors)
+        progress_bar.empty()
+        store_dataset(key, dataset, errors=errors)
+    return dataset
+
+# Function to get the registry's shared copy of the dataset loaded from a list of
+# files, loading it on first use. The session keeps its lease on the dataset
+# until it moves to other files or ends, so the registry does not drop it.
+def lease_student_data(sources):
+    key = dataset_key(sources)
+    lease = st.session_state.get("dataset_lease")
+    if lease is None or lease.key != key:
+        if lease is not None:
+            lease.release()
+        lease = registry.lease(key, lambda: load_student_data(sources))
+        st.session_state["dataset_lease"] = lease
+    return lease
+
+# Function to get the filter indexes of a leased dataset, built once and shared across sessions
+def load_filter_index(lease):
+    return lease.resource("filter index", FilterIndex, lease.dataset)
+
+# Function to get the report store of a leased dataset, shared across sessions,
+# with its own worker thread precomputing the reports
+def load_report_store(lease):
+    return lease.resource("report store", ReportStore)
+
+# Function to get the aggregate statistics per school, grade and term of a dataset
+def report_aggregates(store, dataset):
+    return store.get("aggregates", build_aggregate_store, dataset)
+
+# Function to get the aggregate store cells matching the filters
+def aggregate_cells(store, dataset, criteria):
+    min_age, max_age, min_grade, max_grade, school = criteria
+    return report_aggregates(store, dataset).select(school, min_grade, max_grade)
+
+# Function to compute the subject analysis of the filtered students. The
+# aggregates are kept per school, grade and term but not per age, so the
+# students are scanned instead while the Age range is narrowed.
+def subject_analysis_data(store, dataset, students, criteria, age_filtered):
+    if age_filtered:
+        return compute_subject_analysis(students)
+    return report_aggregates(store, dataset).subject_analysis(aggregate_cells(store, dataset, criteria))
+
+# Function to compute the per-grade statistics of the filtered students from the
+# aggregates, or None while the Age range is narrowed
+def grade_statistics_data(store, dataset, criteria, age_filtered):
+    if age_filtered:
+        return None
+    return report_aggregates(store, dataset).grade_comparison(aggregate_cells(store, dataset, criteria))
+
+# Function to sort each grade of the filtered students by overall score once per
+# filter selection, so changing the grade thresholds reuses the same ranking
+def grade_ranking(store, students, criteria):
+    return store.get(("grade ranking", criteria), GradeRanking, students)
+
+# Function to compute the grade comparison of the filtered students for a pair of thresholds
+def grade_comparison_data(store, students, criteria, at_risk, excelling):
+    return compute_grade_comparison(students, at_risk, excelling, grade_ranking(store, students, criteria))
+
+# Function to list the data every report needs for the current filters, with the
+# default thresholds, as store keys mapped to the function and arguments computing it
+def report_tasks(store, dataset, students, criteria, age_filtered):
+    return {
+        "timeline": (StudentTimeline, dataset),
+        "aggregates": (build_aggregate_store, dataset),
+        ("subject analysis", criteria): (subject_analysis_data, store, dataset, students, criteria, age_filtered),
+        ("pathway analysis", criteria, tuple(pathway_thresholds.values())): (compute_pathway_analysis, students, pathways, pathway_thresholds),
+        ("grade ranking", criteria): (GradeRanking, students),
+        ("grade statistics", criteria): (grade_statistics_data, store, dataset, criteria, age_filtered),
+        ("grade comparison", criteria, at_risk_score, excelling_score): (grade_comparison_data, store, students, criteria, at_risk_score, excelling_score),
+    }
+
+# Function to show how many reports the worker has finished, refreshing until all
+# are. The refresh interval is fixed when the fragment is created, so once every
+# report is done the whole script is rerun to create it without one.
+def show_report_progress(store, keys):
+    def refresh():
+        done = store.progress(keys)
+        if done < len(keys):
+            st.progress(done / len(keys), text=f"Preparing reports: {done} of {len(keys)}")
+        elif pending:
+            st.rerun()
+
+    pending = store.progress(keys) < len(keys)
+    with st.sidebar:
+        st.fragment(refresh, run_every=0.5 if pending else None)()
 
 # Function to filter students based on user-selected criteria
-def filter_students(students, min_age=None, max_age=None, min_grade=None, max_grade=None, school=None):
-    filtered_students = students
-    if min_age:
-        filtered_students = [student for student in filtered_students if student['Age'] >= min_age]
-    if max_age:
-        filtered_students = [student for student in filtered_students if student['Age'] <= max_age]
-    if min_grade:
-        filtered_students = [student for student in filtered_students if student['Grade'] >= min_grade]
-    if max_grade:
-        filtered_students = [student for student in filtered_students if student['Grade'] <= max_grade]
-    if school and school != "All":
-        filtered_students = [student for student in filtered_students if student['School'] == school]
-    return filtered_students
-
-# Function to generate and display a radar chart
-def generate_radar_chart(student, title):
-    subject_scores = student["Subjects"]
-    values = [subject_scores.get(subject, 0) for subject in subjects]
+@timed(argument_rows)
+def filter_students(dataset, min_age=None, max_age=None, min_grade=None, max_grade=None, school=None, index=None):
+    if index is None:
+        index = FilterIndex(dataset)
+    return index.filter(min_age=min_age, max_age=max_age, min_grade=min_grade, max_grade=max_grade, school=school)
+
+# Function to show a sidebar range slider over a column's values
+def sidebar_range(label, index, column):
+    values = index.sorted[column][1]
+    if len(values) == 0:
+        return None, None
+    return range_slider(label, values[0], values[-1])
+
+# Function to show a sidebar range slider from low to high, unless they are equal
+def range_slider(label, low, high):
+    if low is None or low == high:
+        return None, None
+    low, high = int(low), int(high)
+    return st.sidebar.slider(label, low, high, (low, high))
+
+# Load student data from CSV files into an on-disk SQLite database, once per set of files
+@timed()
+def load_student_database(sources):
+    key = dataset_key(sources)
+    path = database_path(key)
+    status = st.empty()
+    build_database(sources, subjects, path, progress=lambda rows: status.write(f"Loaded {rows:,} students into SQLite"))
+    status.empty()
+    return open_student_database(path)
+
+# Open each database once, shared across reruns and sessions
+@st.cache_resource(max_entries=4)
+def open_student_database(path):
+    return StudentDatabase(path, subjects)
+
+# Function to show the timing spans of this rerun in a collapsible sidebar panel,
+# outer spans first with the spans inside them indented below
+def show_timings(run):
+    with st.sidebar.expander("Timings"):
+        records = run.records()
+        if records:
+            columns = {
+                "Span": ["\u2003" * record["depth"] + record["span"] for record in records],
+                "Rows": [record["rows"] for record in records],
+                "Wall (ms)": [1000 * record["wall_seconds"] for record in records],
+                "CPU (ms)": [1000 * record["cpu_seconds"] for record in records],
+                "Figures": [record["figures"] for record in records],
+            }
+            if profile_details:
+                columns["Retained (KiB)"] = [(record["retained_bytes"] or 0) / 1024 for record in records]
+                columns["Peak (KiB)"] = [(record["peak_bytes"] or 0) / 1024 for record in records]
+                columns["Figure (KiB)"] = [record["figure_bytes"] / 1024 for record in records]
+                columns["Serialize (ms)"] = [1000 * record["figure_seconds"] for record in records]
+            st.dataframe(pd.DataFrame(columns).round(1), hide_index=True)
+        st.caption(f"Rerun took {1000 * run.elapsed():,.0f} ms. Spans are logged to {timing_log}.")
+        if not profile_details:
+            st.caption("Set SCHOLARSENSE_PROFILE=1 to trace allocations and figure sizes.")
+
+# Function to warn about the problem cells found while loading, with the report listing them
+def show_validation_errors(count, report):
+    if count:
+        st.warning(f"{count:,} values could not be read and were left blank.")
+        st.download_button("Download validation report", report, "validation_errors.csv", "text/csv")
+
+# Function to show a student's grade rank, or that they have no scores to rank
+def show_grade_rank(grade_rank, grade_percentile):
+    if grade_rank:
+        st.write(f"**GRADE RANK:** {grade_rank:,} ({grade_percentile:.1f}th percentile)")
+    else:
+        st.write("**GRADE RANK:** Not ranked, no scores")
+
+# Function to show each subject score with its percentile rank nationally and in school
+def show_subject_percentiles(subject_scores, national, in_school):
+    st.write("**SUBJECT PERCENTILES:**")
+    for subject, score in subject_scores.items():
+        if score is None:
+            st.write(f"{subject}: No score")
+        else:
+            st.write(f"{subject}: {score} ({national[subject]:.1f}th percentile nationally, {in_school[subject]:.1f}th in school)")
 
-    fig = go.Figure()
+# Function to generate and display a student's subject scores across terms
+@timed(lambda result, dataset, rows, title: len(rows))
+def generate_timeline_chart(dataset, rows, title):
+    labels = [f"Grade {grade} Term {term}" for grade, term in zip(dataset.columns["Grade"][rows], dataset.columns["Term"][rows])]
 
-    fig.add_trace(go.Scatterpolar(
-        r=values,
-        theta=subjects,
-        fill='toself',
-        name=student['Name']
-    ))
+    fig = go.Figure()
+    for j, subject in enumerate(dataset.subjects):
+        fig.add_trace(go.Scatter(x=labels, y=float_scores(dataset.scores[rows, j]), mode='lines+markers', name=subject))
 
     fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[50, 100]  # Set the range of the radar chart
-            ),
-        ),
-        showlegend=True,
         title=title,
-        height=600,
-        width=800,
+        xaxis_title="Term",
+        yaxis_title="Score",
+        yaxis=dict(range=[0, 100]),
     )
 
-    st.plotly_chart(fig)
+    show_chart(fig)
 
-# Function to generate and display a subject analysis report
-def generate_subject_analysis(students):
-    subject_data = {subject: [] for subject in subjects}
-    for student in students:
-        for subject, score in student["Subjects"].items():
-            subject_data[subject].append(score)
+# Function to generate and display a subject analysis report, from precomputed
+# aggregates when given or by scanning the students
+@timed(argument_rows)
+def generate_subject_analysis(dataset, subject_data=None):
+    if subject_data is None:
+        subject_data = compute_subject_analysis(dataset)
 
     show_details = st.checkbox("Show Subject Details")
 
-    for subject, scores in subject_data.items():
+    for subject, summary in subject_data.items():
         st.subheader(f"{subject} Analysis")
-        st.write(f"Average Score: {sum(scores) / len(scores):.2f}")
-        st.write(f"Minimum Score: {min(scores)}")
-        st.write(f"Maximum Score: {max(scores)}")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']}")
+        st.write(f"Maximum Score: {summary['max']}")
+        st.write(f"Standard Deviation: {summary['std']:.2f}")
+        st.write(f"Median Score: {summary['quartiles'][1]}")
+        st.write(f"Interquartile Range: {summary['quartiles'][0]} - {summary['quartiles'][2]}")
 
         if show_details:
             # Plot the score distribution for the subject
-            fig = go.Figure(data=[go.Histogram(x=scores, nbinsx=10)])
-            fig.update_layout(
-                title=f"{subject} Score Distribution",
-                xaxis_title="Score",
-                yaxis_title="Count",
-            )
-            st.plotly_chart(fig)
-
-# Function to generate and display a pathway analysis report
-def generate_pathway_analysis(students):
-    pathway_data = {pathway: [] for pathway in pathways}
-
-    for student in students:
-        student_subjects = set(subject for subject, score in student["Subjects"].items() if score >= 70)
-        for pathway, required_subjects in pathways.items():
-            if set(required_subjects).issubset(student_subjects):
-                pathway_data[pathway].append(student)
+            fig = histogram_figure(summary["scores"], f"{subject} Score Distribution", "Score", weights=summary.get("weights"))
+            show_chart(fig)
+
+# Function to generate and display a pathway analysis report, reading the pathway
+# members from the report store when given
+@timed(argument_rows)
+def generate_pathway_analysis(dataset, store=None, criteria=None):
+    with st.sidebar.expander("Pathway Thresholds"):
+        thresholds = {
+            pathway: st.number_input(f"{pathway} minimum score", 0, 100, pathway_thresholds[pathway])
+            for pathway in pathways
+        }
+    if store is None:
+        pathway_data = compute_pathway_analysis(dataset, pathways, thresholds)
+    else:
+        pathway_data = store.get(("pathway analysis", criteria, tuple(thresholds.values())), compute_pathway_analysis, dataset, pathways, thresholds)
 
     show_details = st.checkbox("Show Pathway Details")
 
-    for pathway, students_in_pathway in pathway_data.items():
+    for pathway, rows in pathway_data.items():
         st.subheader(f"{pathway} Pathway")
+        st.write(f"Students: {len(rows)}")
 
         if show_details:
-            for student in students_in_pathway:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {student['Subjects'][subject]}' for subject in pathways[pathway]])}")
+            columns = ["Name", "School", *pathways[pathway], "Overall"]
+            show_student_table(dataset_table(f"{pathway} Pathway", dataset, rows, columns), f"{pathway} Pathway")
 
             # Plot radar charts for students in the pathway
-            for student in students_in_pathway:
-                generate_radar_chart(student, f"{pathway} Pathway - {student['Name']}")
-
-# Function to generate and display a grade comparison report
-def generate_grade_comparison(students):
-    grade_data = {}
-    for student in students:
-        grade = student["Grade"]
-        if grade not in grade_data:
-            grade_data[grade] = []
-        grade_data[grade].append(student)
+            generate_radar_drilldown(dataset, rows, rows, f"{pathway} Pathway")
+
+# Function to generate and display a grade comparison report. The per-grade
+# statistics come from precomputed aggregates when given; the student lists
+# always come from the ranking. With a report store, the ranking and the lists
+# are read from it.
+@timed(argument_rows)
+def generate_grade_comparison(dataset, grade_stats=None, store=None, criteria=None):
+    with st.sidebar.expander("Grade Thresholds"):
+        at_risk = st.number_input("At-risk below overall score", 0, 100, at_risk_score)
+        excelling = st.number_input("Excelling from overall score", 0, 100, excelling_score)
+        top_count = st.number_input("Top and bottom students per grade", 1, 100, ranking_count)
+    if store is None:
+        ranking = GradeRanking(dataset)
+        grade_data = compute_grade_comparison(dataset, at_risk, excelling, ranking)
+    else:
+        ranking = grade_ranking(store, dataset, criteria)
+        grade_data = store.get(("grade comparison", criteria, at_risk, excelling), grade_comparison_data, store, dataset, criteria, at_risk, excelling)
+    if grade_stats is None:
+        grade_stats = grade_data
+    overall = ranking.overall
+    columns = ["Name", "School", *dataset.subjects, "Overall"]
 
     show_details = st.checkbox("Show Grade Details")
     show_at_risk = st.checkbox("Show At-Risk Students")
     show_excelling = st.checkbox("Show Excelling Students")
+    show_ranking = st.checkbox("Show Top and Bottom Students")
 
-    for grade, students_in_grade in grade_data.items():
+    for grade, summary in grade_stats.items():
+        students = grade_data.get(grade)
         st.subheader(f"Grade {grade} Performance Analysis")
 
-        # Calculate the overall score for each student
-        student_scores = [sum(student["Subjects"].values()) / len(subjects) for student in students_in_grade]
-
         # Plot the score distribution for the grade
-        fig = go.Figure(data=[go.Histogram(x=student_scores, nbinsx=10)])
-        fig.update_layout(
-            title=f"Grade {grade} Score Distribution",
-            xaxis_title="Overall Score",
-            yaxis_title="Count",
-        )
-        st.plotly_chart(fig)
+        fig = histogram_figure(summary["scores"], f"Grade {grade} Score Distribution", "Overall Score", weights=summary.get("weights"))
+        show_chart(fig)
 
         # Display grade performance summary
         st.write("**Grade Performance Summary:**")
-        st.write(f"Average Score: {sum(student_scores) / len(student_scores):.2f}")
-        st.write(f"Minimum Score: {min(student_scores)}")
-        st.write(f"Maximum Score: {max(student_scores)}")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']:.2f}")
+        st.write(f"Maximum Score: {summary['max']:.2f}")
+        st.write(f"Median Score: {summary['quartiles'][1]:.2f}")
+        st.write(f"Interquartile Range: {summary['quartiles'][0]:.2f} - {summary['quartiles'][2]:.2f}")
+
+        # The statistics may cover a grade with no ranked students to list
+        if students is None:
+            continue
 
         if show_details:
             # Display student details and radar charts
             st.write("**Student Details:**")
-            for student in students_in_grade:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
-                generate_radar_chart(student, f"Grade {grade} - {student['Name']}")
+            show_student_table(dataset_table(f"Grade {grade}", dataset, students["rows"], columns), f"Grade {grade}")
+            generate_radar_drilldown(dataset, students["rows"], students["rows"], f"Grade {grade}")
+
+        if show_at_risk:
+            st.write(f"**At-Risk Students ({len(students['at_risk']):,}):**")
+            show_student_table(dataset_table(f"Grade {grade} at-risk", dataset, students["at_risk"], columns), f"Grade {grade} at-risk")
+
+        if show_excelling:
+            st.write(f"**Excelling Students ({len(students['excelling']):,}):**")
+            show_student_table(dataset_table(f"Grade {grade} excelling", dataset, students["excelling"], columns), f"Grade {grade} excelling")
+
+        if show_ranking:
+            st.write(f"**Top {top_count} Students:**")
+            for row in ranking.top(grade, top_count):
+                st.write(f"{dataset.names[row]}: {overall[row]:.2f}")
+            st.write(f"**Bottom {top_count} Students:**")
+            for row in ranking.bottom(grade, top_count):
+                st.write(f"{dataset.names[row]}: {overall[row]:.2f}")
+
+# Function to generate and display a pathway analysis report with the counts
+# computed in the database and only the listed students fetched from it
+@timed()
+def generate_database_pathway_analysis(database, criteria):
+    with st.sidebar.expander("Pathway Thresholds"):
+        thresholds = {
+            pathway: st.number_input(f"{pathway} minimum score", 0, 100, pathway_thresholds[pathway])
+            for pathway in pathways
+        }
+    pathway_counts = database.pathway_counts(pathways, thresholds, **criteria)
+
+    show_details = st.checkbox("Show Pathway Details")
+
+    for pathway, count in pathway_counts.items():
+        st.subheader(f"{pathway} Pathway")
+        st.write(f"Students: {count}")
+
+        if show_details:
+            condition = " AND ".join(f"{quoted(subject)} >= ?" for subject in pathways[pathway])
+            condition_params = [thresholds[pathway]] * len(pathways[pathway])
+            columns = ["Name", "School", *pathways[pathway], "Overall"]
+            show_student_table(DatabaseStudentTable(database, columns, condition, condition_params, criteria=criteria), f"{pathway} Pathway")
+
+            members, _ = database.students(condition, condition_params, limit=database_list_limit, **criteria)
+            if count > len(members):
+                st.write(f"The radar charts show the first {len(members):,} of {count:,} students.")
+
+            # Plot radar charts for the listed students
+            rows = np.arange(len(members))
+            generate_radar_drilldown(members, rows, rows, f"{pathway} Pathway")
+
+# Function to generate and display a grade comparison report with the statistics
+# computed in the database and only the listed students fetched from it
+@timed()
+def generate_database_grade_comparison(database, criteria):
+    with st.sidebar.expander("Grade Thresholds"):
+        at_risk = st.number_input("At-risk below overall score", 0, 100, at_risk_score)
+        excelling = st.number_input("Excelling from overall score", 0, 100, excelling_score)
+        top_count = st.number_input("Top and bottom students per grade", 1, 100, ranking_count)
+    grade_stats = database.grade_comparison(**criteria)
+    columns = ["Name", "School", *subjects, "Overall"]
+
+    show_details = st.checkbox("Show Grade Details")
+    show_at_risk = st.checkbox("Show At-Risk Students")
+    show_excelling = st.checkbox("Show Excelling Students")
+    show_ranking = st.checkbox("Show Top and Bottom Students")
+
+    for grade, summary in grade_stats.items():
+        grade_criteria = {**criteria, "min_grade": grade, "max_grade": grade}
+        st.subheader(f"Grade {grade} Performance Analysis")
+
+        # Plot the score distribution for the grade
+        fig = histogram_figure(summary["scores"], f"Grade {grade} Score Distribution", "Overall Score", weights=summary["weights"])
+        show_chart(fig)
+
+        # Display grade performance summary
+        st.write("**Grade Performance Summary:**")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']:.2f}")
+        st.write(f"Maximum Score: {summary['max']:.2f}")
+        st.write(f"Median Score: {summary['quartiles'][1]:.2f}")
+        st.write(f"Interquartile Range: {summary['quartiles'][0]:.2f} - {summary['quartiles'][2]:.2f}")
+
+        if show_details:
+            # Display student details and radar charts, best overall score first
+            st.write("**Student Details:**")
+            show_student_table(DatabaseStudentTable(database, columns, "overall IS NOT NULL", (), "overall DESC, id DESC", grade_criteria), f"Grade {grade}")
+
+            members, _ = database.students("overall IS NOT NULL", order="overall DESC, id DESC", limit=database_list_limit, **grade_criteria)
+            if summary["students"] > len(members):
+                st.write(f"The radar charts show the first {len(members):,} of {summary['students']:,} students.")
+            rows = np.arange(len(members))
+            generate_radar_drilldown(members, rows, rows, f"Grade {grade}")
 
+        # Students without an overall score (NULL) match neither threshold
         if show_at_risk:
-            st.write("**At-Risk Students:**")
-            at_risk_students = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) < 60]
-            for student in at_risk_students:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
+            table = DatabaseStudentTable(database, columns, "overall < ?", (at_risk,), "overall, id", grade_criteria)
+            st.write(f"**At-Risk Students ({table.count():,}):**")
+            show_student_table(table, f"Grade {grade} at-risk")
 
         if show_excelling:
-            st.write("**Excelling Students:**")
-            excelling_students = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) >= 90]
-            for student in excelling_students:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
+            table = DatabaseStudentTable(database, columns, "overall >= ?", (excelling,), "overall DESC, id DESC", grade_criteria)
+            st.write(f"**Excelling Students ({table.count():,}):**")
+            show_student_table(table, f"Grade {grade} excelling")
+
+        if show_ranking:
+            st.write(f"**Top {top_count} Students:**")
+            students, _ = database.students("overall IS NOT NULL", order="overall DESC, id DESC", limit=top_count, **grade_criteria)
+            for row in range(len(students)):
+                st.write(f"{students.names[row]}: {students.columns['Overall'][row]:.2f}")
+            st.write(f"**Bottom {top_count} Students:**")
+            students, _ = database.students("overall IS NOT NULL", order="overall, id", limit=top_count, **grade_criteria)
+            for row in range(len(students)):
+                st.write(f"{students.names[row]}: {students.columns['Overall'][row]:.2f}")
 
 # Streamlit app
 st.set_page_config(
@@ -176,20 +484,109 @@ st.title("ScholarSense")
 
 # Sidebar menu to choose reports
 report_choice = st.sidebar.radio("Choose Report:", ("STUDENT PROFILES", "SUBJECT ANALYSIS", "PATHWAY ANALYSIS", "GRADE COMPARISON"))
+storage_choice = st.sidebar.radio("Storage:", storage_options, index=storage_options.index(default_storage))
+
+# Time the loading, filtering and reports of this rerun
+start_run(report=report_choice, storage=storage_choice)
 
 # Load student data
-st.write("Please upload the CSV file containing student data.")
-uploaded_file = st.file_uploader("Upload CSV", type=["csv"])
+st.write("Please upload the CSV files containing student data, for example one file per school per term.")
+uploaded_files = st.file_uploader("Upload CSV", type=["csv"], accept_multiple_files=True)
+directory = st.text_input("Or load every CSV file in a directory on the server:")
+
+sources = list(uploaded_files or [])
+if not sources and directory:
+    sources = csv_files(directory) if os.path.isdir(directory) else []
+    if not sources:
+        st.error(f"No CSV files found in {directory}")
+
+if sources and storage_choice == "SQLite on disk":
+    database = load_student_database(sources)
+    validation_errors = database.validation_errors()
+    show_validation_errors(len(validation_errors), validation_errors.to_csv(index=False).encode())
+
+    # Sidebar filters, pushed down to the database as indexed WHERE clauses
+    min_age, max_age = range_slider("Age", *database.column_range("Age"))
+    min_grade, max_grade = range_slider("Grade", *database.column_range("Grade"))
+    school = st.sidebar.selectbox("School", ["All"] + database.school_names())
+    criteria = dict(min_age=min_age, max_age=max_age, min_grade=min_grade, max_grade=max_grade, school=school)
+    student_count = database.count(**criteria)
+    st.sidebar.write(f"{student_count:,} of {database.count():,} students")
+
+    if report_choice == "STUDENT PROFILES" and student_count:
+        # Fetch only the selected student from the database
+        selected_student_index = st.number_input(f"Select a Student (1 to {student_count:,}):", 1, student_count, 1) - 1
+        students, _ = database.students(limit=1, offset=selected_student_index, **criteria)
+        selected_student = students.record(0)
 
-if uploaded_file is not None:
-    students_df = load_student_data(uploaded_file)
-    random_students = students_df.to_dict(orient="records")
-    filtered_students = filter_students(random_students, None, None, None, None, "All")
+        # Display selected student details
+        st.write(f"**STUDENT:** {selected_student['Name']}")
+        st.write(f"**AGE:** {selected_student['Age']}")
+        st.write(f"**GRADE:** {selected_student['Grade']}")
+        grade = selected_student['Grade']
+        totals, scored = students.score_totals()
+        show_grade_rank(*database.grade_rank(grade, int(totals[0]), int(scored[0])))
+        st.write(f"**SCHOOL:** {selected_student['School']}")
+
+        # Place each subject score among the student's grade nationally and in their school
+        national = database.subject_percentiles(students.scores[0], min_grade=grade, max_grade=grade)
+        in_school = database.subject_percentiles(students.scores[0], min_grade=grade, max_grade=grade, school=selected_student['School'])
+        show_subject_percentiles(selected_student['Subjects'], national, in_school)
 
-    if report_choice == "STUDENT PROFILES":
+        # Generate and display radar chart for the selected student
+        generate_radar_chart(selected_student, subjects, f"Subject Radar Chart for {selected_student['Name']}")
+
+        # Show the student's other terms through the name index
+        history = database.history(selected_student['Name'], selected_student['School'])
+        if len(history) > 1:
+            generate_timeline_chart(history, np.arange(len(history)), f"Term History for {selected_student['Name']}")
+
+    elif report_choice == "STUDENT PROFILES":
+        st.write("No students match the filters.")
+
+    elif report_choice == "SUBJECT ANALYSIS":
+        # Generate and display subject analysis report from grouped score counts
+        generate_subject_analysis(None, database.subject_analysis(**criteria))
+
+    elif report_choice == "PATHWAY ANALYSIS":
+        # Generate and display pathway analysis report
+        generate_database_pathway_analysis(database, criteria)
+
+    elif report_choice == "GRADE COMPARISON":
+        # Generate and display grade comparison report
+        generate_database_grade_comparison(database, criteria)
+
+elif sources:
+    dataset_lease = lease_student_data(sources)
+    student_dataset = dataset_lease.dataset
+    show_validation_errors(*load_cached_errors(dataset_lease.key))
+    filter_index = load_filter_index(dataset_lease)
+
+    # Sidebar filters
+    min_age, max_age = sidebar_range("Age", filter_index, "Age")
+    min_grade, max_grade = sidebar_range("Grade", filter_index, "Grade")
+    school = st.sidebar.selectbox("School", ["All"] + sorted(str(name) for name in student_dataset.school_names))
+    filtered_students = filter_students(student_dataset, min_age, max_age, min_grade, max_grade, school, index=filter_index)
+    st.sidebar.write(f"{len(filtered_students):,} of {len(student_dataset):,} students")
+
+    # Queue every report's data for these filters on the background worker, so
+    # switching reports only looks the results up
+    criteria = (min_age, max_age, min_grade, max_grade, school)
+    ages = filter_index.sorted["Age"][1]
+    age_filtered = min_age is not None and (min_age, max_age) != (int(ages[0]), int(ages[-1]))
+    report_store = load_report_store(dataset_lease)
+    tasks = report_tasks(report_store, student_dataset, filtered_students, criteria, age_filtered)
+    for key, (function, *args) in tasks.items():
+        report_store.submit(key, function, *args)
+    show_report_progress(report_store, list(tasks))
+
+    if report_choice == "STUDENT PROFILES" and len(filtered_students) == 0:
+        st.write("No students match the filters.")
+
+    elif report_choice == "STUDENT PROFILES":
         # Create a dropdown menu to select students
         selected_student_index = st.selectbox("Select a Student:", range(len(filtered_students)))
-        selected_student = filtered_students[selected_student_index]
+        selected_student = filtered_students.record(selected_student_index)
 
         # Display selected student details
         if 'Name' in selected_student:
@@ -198,19 +595,39 @@ if uploaded_file is not None:
             st.write("No student name found in the selected student data.")
         st.write(f"**AGE:** {selected_student['Age']}")
         st.write(f"**GRADE:** {selected_student['Grade']}")
+        show_grade_rank(filtered_students.columns['Grade Rank'][selected_student_index], filtered_students.columns['Grade Percentile'][selected_student_index])
         st.write(f"**SCHOOL:** {selected_student['School']}")
 
+        # Place each subject score among the student's grade nationally and in their school
+        grade = selected_student['Grade']
+        student_scores = filtered_students.scores[selected_student_index]
+        aggregates = report_aggregates(report_store, student_dataset)
+        national = aggregates.subject_percentiles(aggregates.select(min_grade=grade, max_grade=grade), student_scores)
+        in_school = aggregates.subject_percentiles(aggregates.select(selected_student['School'], grade, grade), student_scores)
+        show_subject_percentiles(selected_student['Subjects'], national, in_school)
+
         # Generate and display radar chart for the selected student
-        generate_radar_chart(selected_student, f"Subject Radar Chart for {selected_student['Name']}")
+        generate_radar_chart(selected_student, subjects, f"Subject Radar Chart for {selected_student['Name']}")
+
+        # Show the student's other terms, looked up from the timeline rather than by scanning
+        filtered_rows = filter_index.query(min_age, max_age, min_grade, max_grade, school)
+        row = selected_student_index if filtered_rows is None else int(filtered_rows[selected_student_index])
+        history = report_store.get("timeline", StudentTimeline, student_dataset).history(row)
+        if len(history) > 1:
+            generate_timeline_chart(student_dataset, history, f"Term History for {selected_student['Name']}")
 
     elif report_choice == "SUBJECT ANALYSIS":
         # Generate and display subject analysis report
-        generate_subject_analysis(filtered_students)
+        generate_subject_analysis(filtered_students, report_store.get(("subject analysis", criteria), subject_analysis_data, report_store, student_dataset, filtered_students, criteria, age_filtered))
 
     elif report_choice == "PATHWAY ANALYSIS":
         # Generate and display pathway analysis report
-        generate_pathway_analysis(filtered_students)
+        generate_pathway_analysis(filtered_students, report_store, criteria)
 
     elif report_choice == "GRADE COMPARISON":
         # Generate and display grade comparison report
-        generate_grade_comparison(filtered_students)
\ No newline at end of file
+        grade_stats = report_store.get(("grade statistics", criteria), grade_statistics_data, report_store, student_dataset, criteria, age_filtered)
+        generate_grade_comparison(filtered_students, grade_stats, report_store, criteria)
+
+# Show where this rerun's time went
+show_timings(finish_run())
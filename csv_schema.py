@@ -0,0 +1,262 @@
+import numpy as np
+import pandas as pd
+
+from student_dataset import info_columns
+from student_timeline import terms_per_year
+
+# Range of a valid subject score
+score_range = (0, 100)
+
+# Range of valid values in each info column
+value_ranges = {"Age": (0, 120), "Grade": (0, 12), "Term": (1, terms_per_year), "Class": (0, 255)}
+
+# Columns of the long layout, which has one row per student and subject instead
+# of one column per subject
+long_columns = ("Subject", "Score")
+
+# Columns that identify a student's row in the long layout. Class is part of the
+# key since two students in a grade can share a name when they are in different classes.
+student_key = ("School", "Name", "Grade", "Class", "Term")
+
+# Columns of the error report
+error_columns = ["File", "Line", "Column", "Value", "Error"]
+
+# Most errors listed in the report; any beyond are only counted
+max_error_rows = 100_000
+
+
+# Problems found in the cells of loaded CSVs, collected one column at a time.
+# A problem cell is read as blank and its row is still loaded, so bad cells
+# never abort a load; the report lists every cell that was blanked.
+class ValidationErrors:
+    def __init__(self):
+        self.parts = []
+        self.count = 0
+        self.listed = 0
+
+    def __len__(self):
+        return self.count
+
+    # Function to record one problem in a column for the rows where mask is set
+    def add(self, file, lines, column, values, mask, message):
+        count = int(np.count_nonzero(mask))
+        if count == 0:
+            return
+        self.count += count
+        listed = min(count, max_error_rows - self.listed)
+        if listed > 0:
+            self.parts.append(pd.DataFrame({
+                "File": file,
+                "Line": lines[mask][:listed],
+                "Column": column,
+                "Value": np.asarray(values)[mask][:listed].astype(str),
+                "Error": message,
+            }))
+            self.listed += listed
+
+    # Function to add the problems collected for another file
+    def extend(self, other):
+        self.parts.extend(other.parts[:max(max_error_rows - self.listed, 0)])
+        self.count += other.count
+        self.listed = sum(len(part) for part in self.parts)
+
+    # Function to list the recorded problems in file and line order
+    def to_frame(self):
+        if not self.parts:
+            return pd.DataFrame(columns=error_columns)
+        return pd.concat(self.parts, ignore_index=True).sort_values(["File", "Line"], kind="stable", ignore_index=True)
+
+    # Function to write the recorded problems as CSV, for download
+    def to_csv(self):
+        return self.to_frame().to_csv(index=False).encode()
+
+
+# Function to tell whether a CSV header is in the long layout
+def is_long_format(columns):
+    return all(column in columns for column in long_columns)
+
+
+# Function to record the expected columns a CSV header is missing; they are read as blank
+def check_columns(columns, subjects, errors, file=""):
+    expected = ["Name", "School", *info_columns, *(long_columns if is_long_format(columns) else subjects)]
+    for column in expected:
+        if column not in columns:
+            errors.add(file, np.zeros(1, dtype=np.int64), column, [""], np.ones(1, dtype=bool), "missing column")
+
+
+# Function to check a numeric column, returning it as float32 with blanks and
+# problem values as NaN. Text that is not a number, values outside [low, high]
+# and fractions are recorded in errors.
+def validate_numbers(frame, column, low, high, errors, file, lines):
+    if column not in frame:
+        return np.full(len(frame), np.nan, dtype=np.float32)
+    raw = frame[column]
+    if raw.dtype.kind == "f":
+        values = np.array(raw, dtype=np.float32)
+    else:
+        values = pd.to_numeric(raw, errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+        errors.add(file, lines, column, raw, np.isnan(values) & raw.notna().to_numpy(), "not a number")
+    outside = (values < low) | (values > high)
+    errors.add(file, lines, column, values, outside, f"outside {low}-{high}")
+    fraction = ~outside & (values != np.round(values)) & ~np.isnan(values)
+    errors.add(file, lines, column, values, fraction, "not a whole number")
+    values[outside | fraction] = np.nan
+    return values
+
+
+# Function to get a text column, or blanks when the CSV does not have it
+def text_column(frame, column):
+    return frame[column] if column in frame else pd.Series("", index=frame.index)
+
+
+# Function to validate the info columns of a frame column by column
+def validate_info(frame, errors, file, lines):
+    return {column: validate_numbers(frame, column, *value_ranges[column], errors, file, lines) for column in info_columns}
+
+
+# Function to validate a chunk in the wide layout (one column per subject),
+# returning the student columns with every problem value blanked
+def map_wide(frame, subjects, errors, file, lines):
+    columns = {"Name": text_column(frame, "Name"), "School": text_column(frame, "School")}
+    columns.update(validate_info(frame, errors, file, lines))
+    columns.update({subject: validate_numbers(frame, subject, *score_range, errors, file, lines) for subject in subjects})
+    return pd.DataFrame(columns)
+
+
+# Function to validate a chunk in the long layout (one row per student and
+# subject), returning its rows with the file line of each, the Name and School
+# text (blank for a missing one), the checked info columns and Score, and the
+# Subject as its position in subjects. Unknown subjects are given as -1 and
+# recorded in errors.
+def long_rows(frame, subjects, errors, file, lines):
+    info = validate_info(frame, errors, file, lines)
+    scores = validate_numbers(frame, "Score", *score_range, errors, file, lines)
+    subject_names = text_column(frame, "Subject")
+    names, uniques = pd.factorize(subject_names)
+    lookup = np.array([subjects.index(name) if name in subjects else -1 for name in uniques] + [-1], dtype=np.int64)
+    subject_codes = lookup[names]
+    errors.add(file, lines, "Subject", subject_names, subject_codes < 0, "unknown subject")
+
+    columns = {"Line": lines}
+    columns.update({column: text_column(frame, column).fillna("").to_numpy(dtype=object) for column in ("Name", "School")})
+    columns.update(info)
+    columns.update({"Subject": subject_codes, "Score": scores})
+    return pd.DataFrame(columns)
+
+
+# Dense codes for int64 keys, numbered in order of first appearance across every
+# batch looked up. The keys seen so far are kept sorted, with their codes, so a
+# batch is looked up with one binary search.
+class KeyCodes:
+    def __init__(self):
+        self.keys = np.zeros(0, dtype=np.int64)
+        self.codes = np.zeros(0, dtype=np.int64)
+        self.count = 0
+
+    # Function to get the code of every key in a batch, numbering new keys as they first appear
+    def lookup(self, keys):
+        local, uniques = pd.factorize(keys)
+        positions = np.searchsorted(self.keys, uniques)
+        found = positions < len(self.keys)
+        found[found] = self.keys[positions[found]] == uniques[found]
+        codes = np.empty(len(uniques), dtype=np.int64)
+        codes[found] = self.codes[positions[found]]
+        new = np.flatnonzero(~found)
+        codes[new] = self.count + np.arange(len(new))
+        self.count += len(new)
+        new = new[np.argsort(uniques[new], kind="stable")]
+        self.keys = np.insert(self.keys, positions[new], uniques[new])
+        self.codes = np.insert(self.codes, positions[new], codes[new])
+        return codes[local]
+
+
+# Students pivoted into the wide layout from the validated rows of a long-layout
+# file (see long_rows) as each chunk is read, so the file is never held whole.
+# Rows are grouped into students by School, Name, Grade, Class and Term, in
+# order of first appearance, and each student keeps the Name, School and info
+# columns of their first row. Between chunks only the students are kept: their
+# keys, sorted for lookup, and each score with the line it was given on, so a
+# subject given again in a later chunk is still found. The last score given is
+# kept; the earlier ones are recorded in errors.
+class LongPivot:
+    def __init__(self, subjects):
+        self.subjects = list(subjects)
+        self.text_key = [column for column in student_key if column not in info_columns]
+        self.number_key = [column for column in student_key if column in info_columns]
+        self.text_codes = {column: {} for column in self.text_key}
+        self.prefixes = KeyCodes()
+        self.students = KeyCodes()
+        self.first_rows = []
+        self.scores = np.full((0, len(self.subjects)), np.nan, dtype=np.float32)
+        self.lines = np.zeros((0, len(self.subjects)), dtype=np.int64)
+
+    def __len__(self):
+        return self.students.count
+
+    # Function to grow the score and line arrays to hold count students, doubling them
+    def reserve(self, count):
+        if count > len(self.scores):
+            capacity = max(count, 2 * len(self.scores))
+            scores = np.full((capacity, len(self.subjects)), np.nan, dtype=np.float32)
+            lines = np.zeros((capacity, len(self.subjects)), dtype=np.int64)
+            scores[:len(self.scores)] = self.scores
+            lines[:len(self.lines)] = self.lines
+            self.scores, self.lines = scores, lines
+
+    # Function to find the student of every row: the text columns of the key are
+    # coded and combined into one prefix code, then the info columns appended
+    # (blank ones as 256, past every valid value)
+    def row_students(self, rows):
+        key = np.zeros(len(rows), dtype=np.int64)
+        for i, column in enumerate(self.text_key):
+            local, uniques = pd.factorize(rows[column].to_numpy())
+            table = self.text_codes[column]
+            codes = np.array([table.setdefault(value, len(table)) for value in uniques], dtype=np.int64)[local]
+            key = codes if i == 0 else self.prefixes.lookup(key * 2 ** 32 + codes)
+        for column in self.number_key:
+            values = rows[column].to_numpy()
+            key = key * 257 + np.where(np.isnan(values), 256, values).astype(np.int64)
+        return self.students.lookup(key)
+
+    # Function to pivot one chunk of validated long rows into the students
+    def add(self, rows, errors, file):
+        before = len(self)
+        students = self.row_students(rows)
+        codes, first_rows = np.unique(students, return_index=True)
+        self.first_rows.append(rows.iloc[first_rows[codes >= before]][["Name", "School", *info_columns]])
+        self.reserve(len(self))
+
+        # Place each known subject's score, keeping the last of any repeats,
+        # whether the earlier ones are in this chunk or an earlier one
+        known = np.flatnonzero(rows["Subject"].to_numpy() >= 0)
+        subject_count = len(self.subjects)
+        positions = students[known] * subject_count + rows["Subject"].to_numpy()[known]
+        order = np.argsort(positions, kind="stable")
+        sorted_positions = positions[order]
+        last = np.ones(len(order), dtype=bool)
+        last[:-1] = sorted_positions[1:] != sorted_positions[:-1]
+        lines = rows["Line"].to_numpy()
+        latest = known[order[last]]
+        latest_positions = sorted_positions[last]
+        earlier = self.lines.ravel()[latest_positions]
+        repeated_lines = np.concatenate([lines[known[order[~last]]], earlier[earlier > 0]])
+        repeated_subjects = np.concatenate([sorted_positions[~last], latest_positions[earlier > 0]]) % subject_count
+        errors.add(
+            file, repeated_lines, "Subject", np.array(self.subjects, dtype=object)[repeated_subjects],
+            np.ones(len(repeated_lines), dtype=bool), "repeated for the student; the last score is used",
+        )
+        self.scores.ravel()[latest_positions] = rows["Score"].to_numpy()[latest]
+        self.lines.ravel()[latest_positions] = lines[latest]
+
+    # Function to give the pivoted students as frames in the wide layout, up to chunk_rows at a time
+    def frames(self, chunk_rows):
+        if not len(self):
+            return
+        first_rows = pd.concat(self.first_rows, ignore_index=True)
+        # The arrays may have spare capacity past the last student
+        scores = self.scores[:len(self)]
+        for start in range(0, len(self), chunk_rows):
+            frame = first_rows.iloc[start:start + chunk_rows].reset_index(drop=True)
+            for j, subject in enumerate(self.subjects):
+                frame[subject] = scores[start:start + chunk_rows, j]
+            yield frame
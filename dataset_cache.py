@@ -0,0 +1,204 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from packed_strings import PackedStrings
+from student_dataset import StudentDataset
+
+# Where parsed datasets are kept between runs, and how much disk they may use
+cache_dir = os.environ.get("SCHOLARSENSE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "scholarsense"))
+max_cache_bytes = int(os.environ.get("SCHOLARSENSE_CACHE_BYTES", 2 * 1024 ** 3))
+
+# Bump when the on-disk layout changes so old entries are not read back
+cache_format = 5
+
+# Subdirectories of the cache holding one file per entry: the SQLite databases
+# and the trained prediction models. They count towards the size cap as well.
+file_entry_dirs = ("sqlite", "models")
+
+# Bytes read at a time while hashing a file
+hash_block_bytes = 8 * 1024 * 1024
+
+
+# Function to hash a file's contents together with the subjects it is parsed against
+def content_hash(source, subjects):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([cache_format, list(subjects)]).encode())
+    stream = open(source, "rb") if isinstance(source, (str, os.PathLike)) else source
+    try:
+        stream.seek(0)
+        for block in iter(lambda: stream.read(hash_block_bytes), b""):
+            digest.update(block)
+        stream.seek(0)
+    finally:
+        if stream is not source:
+            stream.close()
+    return digest.hexdigest()
+
+
+# Function to combine the content hashes of several files, in order, into one key
+def combined_hash(keys):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([cache_format, list(keys)]).encode())
+    return digest.hexdigest()
+
+
+# Function to hash the contents of an in-memory dataset
+def dataset_fingerprint(dataset):
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(json.dumps([cache_format, list(dataset.subjects)]).encode())
+    for name, values in sorted(dataset_arrays(dataset).items()):
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(values).tobytes())
+    return digest.hexdigest()
+
+
+# Function to list a dataset's arrays under the file names they are cached as
+def dataset_arrays(dataset):
+    names = dataset.names.compact()
+    arrays = {
+        "scores": dataset.scores,
+        "name_bytes": names.used_bytes(),
+        "name_offsets": names.relative_offsets(),
+        "school_codes": dataset.school_codes,
+        "school_names": np.asarray(dataset.school_names, dtype=str),
+    }
+    arrays.update({f"column_{column}": values for column, values in dataset.columns.items()})
+    return arrays
+
+
+# Function to get the size in bytes of every file in a directory
+def directory_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+# Function to write a dataset to the cache as one .npy file per array, with the
+# validation errors found while loading it as a CSV report
+def store_dataset(key, dataset, directory=None, errors=None):
+    directory = directory or cache_dir
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, key)
+    if os.path.exists(target):
+        return target
+
+    # Write into a temporary directory and rename it, so readers never see a partial entry
+    staging = tempfile.mkdtemp(prefix=f".{key}-", dir=directory)
+    try:
+        for name, values in dataset_arrays(dataset).items():
+            np.save(os.path.join(staging, f"{name}.npy"), values, allow_pickle=False)
+        if errors:
+            with open(os.path.join(staging, "errors.csv"), "wb") as report:
+                report.write(errors.to_csv())
+        with open(os.path.join(staging, "meta.json"), "w") as meta:
+            json.dump({
+                "format": cache_format,
+                "subjects": dataset.subjects,
+                "columns": list(dataset.columns),
+                "errors": len(errors) if errors else 0,
+            }, meta)
+        os.replace(staging, target)
+    except OSError:
+        shutil.rmtree(staging, ignore_errors=True)
+        if not os.path.exists(target):
+            raise
+    evict(directory, keep=key)
+    return target
+
+
+# Function to open a cached dataset with every array memory-mapped, or None if it is not cached
+def load_cached_dataset(key, directory=None):
+    directory = directory or cache_dir
+    target = os.path.join(directory, key)
+    try:
+        with open(os.path.join(target, "meta.json")) as handle:
+            meta = json.load(handle)
+        if meta["format"] != cache_format:
+            return None
+
+        def array(name):
+            return np.load(os.path.join(target, f"{name}.npy"), mmap_mode="r", allow_pickle=False)
+
+        dataset = StudentDataset(
+            meta["subjects"],
+            array("scores"),
+            {column: array(f"column_{column}") for column in meta["columns"]},
+            PackedStrings(array("name_bytes"), array("name_offsets")),
+            array("school_codes"),
+            np.load(os.path.join(target, "school_names.npy")),
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+    # Record the access time used for LRU eviction
+    touch(os.path.join(target, "meta.json"))
+    return dataset
+
+
+# Function to get the number of validation errors found while loading a cached
+# dataset and the CSV report listing them, or (0, None) if there were none
+def load_cached_errors(key, directory=None):
+    target = os.path.join(directory or cache_dir, key)
+    try:
+        with open(os.path.join(target, "meta.json")) as handle:
+            count = json.load(handle).get("errors", 0)
+        if count == 0:
+            return 0, None
+        with open(os.path.join(target, "errors.csv"), "rb") as report:
+            return count, report.read()
+    except (OSError, ValueError):
+        return 0, None
+
+
+# Function to list the cache entries as (last access time, path, size): the
+# dataset directories, and the files in the per-file subdirectories. Entries
+# still being written have names starting with a dot and are left out.
+def cache_entries(directory):
+    entries = []
+    for entry in os.scandir(directory):
+        meta = os.path.join(entry.path, "meta.json")
+        if entry.is_dir() and not entry.name.startswith(".") and os.path.exists(meta):
+            entries.append((os.path.getmtime(meta), entry.path, directory_size(entry.path)))
+    for name in file_entry_dirs:
+        subdirectory = os.path.join(directory, name)
+        if os.path.isdir(subdirectory):
+            for entry in os.scandir(subdirectory):
+                if entry.is_file() and not entry.name.startswith("."):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.path, stat.st_size))
+    return entries
+
+
+# Function to record that a cached file was used, for LRU eviction
+def touch(path):
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+# Function to delete the least recently used entries until the cache fits its
+# size cap. keep names an entry that is never deleted, as a key or a path.
+def evict(directory=None, keep=None, limit=None):
+    directory = directory or cache_dir
+    limit = max_cache_bytes if limit is None else limit
+    keep = None if keep is None else os.path.join(directory, keep)
+    entries = cache_entries(directory)
+
+    total = sum(size for _, _, size in entries)
+    for _, path, size in sorted(entries):
+        if total <= limit:
+            break
+        if path == keep:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        total -= size
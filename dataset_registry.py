@@ -0,0 +1,113 @@
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+# Bytes of datasets kept loaded once no session is using them; datasets in use
+# are never dropped, even past the budget
+registry_bytes = int(os.environ.get("SCHOLARSENSE_REGISTRY_BYTES", 1024 ** 3))
+
+
+# Function to make every array of a dataset read-only, so the sessions sharing it cannot change it
+def freeze(dataset):
+    arrays = [dataset.scores, dataset.school_codes, dataset.school_names, dataset.names.buffer, dataset.names.offsets]
+    if dataset.names.rows is not None:
+        arrays.append(dataset.names.rows)
+    for values in arrays + list(dataset.columns.values()):
+        values.flags.writeable = False
+    return dataset
+
+
+# One registered dataset, with the number of leases held on it and the resources
+# built from it (filter indexes, report stores), which are dropped along with it
+class RegistryEntry:
+    def __init__(self, dataset):
+        self.dataset = freeze(dataset)
+        self.nbytes = sum(dataset.memory_usage().values())
+        self.leases = 0
+        self.resources = {}
+        self.lock = threading.Lock()
+
+    # Function to get a resource built from the dataset, building it on first use
+    def resource(self, name, build, *args):
+        with self.lock:
+            if name not in self.resources:
+                self.resources[name] = build(*args)
+            return self.resources[name]
+
+
+# A session's hold on a registered dataset. It is released by release(), or when
+# it is garbage collected with the session that held it.
+class Lease:
+    def __init__(self, registry, key, entry):
+        self.key = key
+        self.entry = entry
+        self.dataset = entry.dataset
+        self.release = weakref.finalize(self, registry.release, entry)
+
+    # Function to get a resource built from the leased dataset, shared by every session
+    def resource(self, name, build, *args):
+        return self.entry.resource(name, build, *args)
+
+
+# Process-wide registry of loaded datasets keyed by content hash. It holds one
+# read-only copy of each dataset, shared by every session using it instead of one
+# copy per session. Datasets no session holds a lease on stay loaded until the
+# registry goes over its memory budget, then the least recently used are dropped.
+class DatasetRegistry:
+    def __init__(self, budget=registry_bytes):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    # Function to total the bytes held by the registered datasets
+    @property
+    def nbytes(self):
+        with self.lock:
+            return sum(entry.nbytes for entry in self.entries.values())
+
+    # Function to lease the dataset registered under a key, loading it with load()
+    # first if it is not registered. Sessions asking for the same key while it
+    # loads wait for that load rather than starting their own.
+    def lease(self, key, load):
+        with self.lock:
+            loading = self.loading.setdefault(key, threading.Lock())
+        with loading:
+            with self.lock:
+                entry = self.entries.get(key)
+            if entry is None:
+                entry = RegistryEntry(load())
+            with self.lock:
+                self.entries[key] = entry
+                self.entries.move_to_end(key)
+                entry.leases += 1
+                self.evict()
+        return Lease(self, key, entry)
+
+    # Function to give back a lease, dropping datasets if the registry is over budget
+    def release(self, entry):
+        with self.lock:
+            entry.leases -= 1
+            self.evict()
+
+    # Function to drop the least recently used datasets without leases until the
+    # registry fits its budget. Called with the lock held.
+    def evict(self):
+        total = sum(entry.nbytes for entry in self.entries.values())
+        for key, entry in list(self.entries.items()):
+            if total <= self.budget:
+                break
+            if entry.leases == 0:
+                del self.entries[key]
+                total -= entry.nbytes
+
+
+# The registry shared by every session in this process
+registry = DatasetRegistry()
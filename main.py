@@ -1,30 +1,31 @@
-import random
-from faker import Faker
+import os
 import plotly.graph_objects as go
 import streamlit as st
 import pandas as pd
-
-# Initialize Faker for generating random names
-fake = Faker()
-
-# Define the possible subjects
-subjects = ["English Language", "Social Studies", "Mathematics", "Integrated Science", "Zambian Languages", "Creative and Technology Studies"]
-
-# Function to generate random student data
-def generate_random_student():
-    student = {
-        "Name": fake.name(),  # Random student name
-        "Subjects": {subject: random.randint(50, 100) for subject in subjects},
-        "Age": random.randint(12, 18),
-        "Grade": random.randint(8, 12),
-        "Term": random.randint(1, 3),
-        "Class": random.randint(1, 5),
-        "School": fake.company(),  # Random school name
-    }
-    return student
-
-# Generate 10 random students
-random_students = [generate_random_student() for _ in range(10)]
+from synthetic_data import generate_history
+from prediction import complete_rows, load_or_train_predictor, prediction_features
+from charts import histogram_figure
+from reports import compute_subject_analysis, compute_grade_comparison, subjects
+from student_table import dataset_table, generate_radar_chart, generate_radar_drilldown, show_student_table
+
+# Number of demo students, the terms they are followed over and the seed they are generated from
+demo_students = int(os.environ.get("SCHOLARSENSE_DEMO_STUDENTS", 10))
+demo_terms = 3
+demo_seed = 0
+
+# Generate the demo students' term history once; reruns and new sessions reuse
+# the same data. The reports show the latest term.
+@st.cache_resource(show_spinner=False)
+def load_demo_dataset(count, terms, seed):
+    history = generate_history(count, terms, seed, subjects)
+    return history, history.take(history.columns["Term"] == terms)
+
+# Train the prediction model once per history; coefficients are also cached on disk
+@st.cache_resource(show_spinner=False)
+def load_demo_predictor(count, terms, seed):
+    return load_or_train_predictor(load_demo_dataset(count, terms, seed)[0])
+
+history_dataset, student_dataset = load_demo_dataset(demo_students, demo_terms, demo_seed)
 
 # Streamlit app
 st.set_page_config(
@@ -39,84 +40,61 @@ st.title("ScholarSense")
 # Sidebar menu to choose reports
 report_choice = st.sidebar.radio("Choose Report:", ("STUDENT PROFILES", "SUBJECT ANALYSIS", "GRADE COMPARISON", "PERFORMANCE PREDICTION"))
 
-# Function to generate and display a radar chart
-def generate_radar_chart(student):
-    subject_scores = student["Subjects"]
-    values = list(subject_scores.values())
-
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatterpolar(
-        r=values,
-        theta=subjects,
-        fill='toself',
-        name=student['Name']
-    ))
-
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[50, 100]  # Set the range of the radar chart
-            ),
-        ),
-        showlegend=True,
-        title=f"Subject Radar Chart for {student['Name']}",
-    )
-
-    st.plotly_chart(fig)
-
 # Function to generate and display a subject analysis report
-def generate_subject_analysis(students):
-    subject_data = {subject: [] for subject in subjects}
-    for student in students:
-        for subject, score in student["Subjects"].items():
-            subject_data[subject].append(score)
+def generate_subject_analysis(dataset):
+    subject_data = compute_subject_analysis(dataset)
 
-    for subject, scores in subject_data.items():
+    for subject, summary in subject_data.items():
         st.subheader(f"{subject} Analysis")
-        st.write(f"Average Score: {sum(scores) / len(scores):.2f}")
-        st.write(f"Minimum Score: {min(scores)}")
-        st.write(f"Maximum Score: {max(scores)}")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']}")
+        st.write(f"Maximum Score: {summary['max']}")
 
         # Plot the score distribution for the subject
-        fig = go.Figure(data=[go.Histogram(x=scores, nbinsx=10)])
-        fig.update_layout(
-            title=f"{subject} Score Distribution",
-            xaxis_title="Score",
-            yaxis_title="Count",
-        )
+        fig = histogram_figure(summary["scores"], f"{subject} Score Distribution", "Score")
         st.plotly_chart(fig)
 
 # Function to generate and display a grade comparison report
-def generate_grade_comparison(students):
-    grade_data = {}
-    for student in students:
-        grade = student["Grade"]
-        if grade not in grade_data:
-            grade_data[grade] = []
-        grade_data[grade].append(student)
-
-    for grade, students_in_grade in grade_data.items():
+def generate_grade_comparison(dataset):
+    grade_data = compute_grade_comparison(dataset)
+    columns = ["Name", *dataset.subjects]
+
+    for grade, summary in grade_data.items():
         st.subheader(f"Grade {grade} Comparison")
-        for student in students_in_grade:
-            st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
+        show_student_table(dataset_table(f"Grade {grade}", dataset, summary["rows"], columns), f"Grade {grade}")
 
-        # Plot the radar chart for the students in the grade
-        for student in students_in_grade:
-            generate_radar_chart(student)
+        # Plot the radar charts for the students in the grade, a page at a time
+        generate_radar_drilldown(dataset, summary["rows"], summary["rows"], f"Grade {grade}")
 
 # Function to generate and display a performance prediction graph
-def generate_performance_prediction(students):
-    # Placeholder prediction logic (random data)
-    predicted_scores = [random.uniform(50, 100) for _ in students]
+def generate_performance_prediction(dataset, predictor):
+    if predictor.coef is None:
+        st.write("Not enough term history to train the prediction model.")
+        return
+
+    st.write(f"Model trained on {predictor.count:,} term-to-term transitions.")
+
+    # Only students with every score can be predicted, as the model has no value
+    # to use for a missing one
+    rows = complete_rows(dataset)
+    skipped = len(dataset) - len(rows)
+    if skipped:
+        st.write(f"{skipped:,} students with missing scores were left out of the prediction.")
+    if len(rows) == 0:
+        return
+    students = dataset.take(rows)
+
+    # Predict every student's next-term scores in one batch
+    predicted = predictor.predict(prediction_features(students))
+    predicted_scores = predicted.mean(axis=1)
 
     fig = go.Figure()
 
     fig.add_trace(go.Scatter(
-        x=[student["Age"] for student in students],
+        x=students.columns["Age"],
         y=predicted_scores,
-        mode='lines+markers',
+        mode='markers',
+        text=students.names.tolist(),
         name="Predicted Performance"
     ))
 
@@ -128,10 +106,22 @@ def generate_performance_prediction(students):
 
     st.plotly_chart(fig)
 
+    # Compare the same students' subject averages this term with the predicted ones
+    fig = go.Figure(data=[
+        go.Bar(x=subjects, y=students.scores.mean(axis=0), name="Current Term"),
+        go.Bar(x=subjects, y=predicted.mean(axis=0), name="Predicted Next Term"),
+    ])
+    fig.update_layout(
+        yaxis_title="Average Score",
+        title="Predicted Subject Averages",
+    )
+
+    st.plotly_chart(fig)
+
 if report_choice == "STUDENT PROFILES":
     # Create a dropdown menu to select students
-    selected_student_index = st.selectbox("Select a Student:", range(len(random_students)))
-    selected_student = random_students[selected_student_index]
+    selected_student_index = st.selectbox("Select a Student:", range(len(student_dataset)))
+    selected_student = student_dataset.record(selected_student_index)
 
     # Display selected student details
     st.write(f"**STUDENT:** {selected_student['Name']}")
@@ -140,16 +130,16 @@ if report_choice == "STUDENT PROFILES":
     st.write(f"**SCHOOL:** {selected_student['School']}")
 
     # Generate and display radar chart for the selected student
-    generate_radar_chart(selected_student)
+    generate_radar_chart(selected_student, subjects, f"Subject Radar Chart for {selected_student['Name']}")
 
 elif report_choice == "SUBJECT ANALYSIS":
     # Generate and display subject analysis report
-    generate_subject_analysis(random_students)
+    generate_subject_analysis(student_dataset)
 
 elif report_choice == "GRADE COMPARISON":
     # Generate and display grade comparison report
-    generate_grade_comparison(random_students)
+    generate_grade_comparison(student_dataset)
 
 elif report_choice == "PERFORMANCE PREDICTION":
     # Generate and display performance prediction graph
-    generate_performance_prediction(random_students)
\ No newline at end of file
+    generate_performance_prediction(student_dataset, load_demo_predictor(demo_students, demo_terms, demo_seed))
\ No newline at end of file
@@ -1,38 +1,38 @@
-import random
-from faker import Faker
-import plotly.graph_objects as go
+import os
 import streamlit as st
 import pandas as pd
-
-# Initialize Faker for generating random names
-fake = Faker()
-
-# Define the possible subjects
-subjects = ["English Language", "Social Studies", "Mathematics", "Integrated Science", "Zambian Languages", "Creative and Technology Studies"]
-
-# Define student pathways
-pathways = {
-    "STEM": ["Mathematics", "Integrated Science"],
-    "Humanities and Social Sciences": ["English Language", "Social Studies"],
-    "Linguistic and Cultural Studies": ["Zambian Languages", "English Language"],
-    "Creative and Design": ["Creative and Technology Studies"],
-}
-
-# Function to generate random student data
-def generate_random_student():
-    student = {
-        "Name": fake.name(),  # Random student name
-        "Subjects": {subject: random.randint(50, 100) for subject in subjects},
-        "Age": random.randint(12, 18),
-        "Grade": random.randint(8, 12),
-        "Term": random.randint(1, 3),
-        "Class": random.randint(1, 5),
-        "School": fake.company(),  # Random school name
-    }
-    return student
-
-# Generate 20 random students
-random_students = [generate_random_student() for _ in range(20)]
+from synthetic_data import generate_dataset
+from charts import histogram_figure
+from reports import compute_subject_analysis, compute_pathway_analysis, compute_grade_comparison, at_risk_score, excelling_score, pathway_thresholds, pathways, subjects
+from ranking import GradeRanking
+from aggregate_store import build_aggregate_store
+from student_table import dataset_table, generate_radar_chart, generate_radar_drilldown, show_student_table
+
+# Students listed at each end of a grade in the top and bottom view
+ranking_count = 5
+
+# Number of demo students and the seed they are generated from
+demo_students = int(os.environ.get("SCHOLARSENSE_DEMO_STUDENTS", 20))
+demo_seed = 0
+
+# Generate the demo students once; reruns and new sessions reuse the same dataset
+@st.cache_resource(show_spinner=False)
+def load_demo_dataset(count, seed):
+    return generate_dataset(count, seed, subjects)
+
+# Sort each grade by overall score once for the demo dataset
+@st.cache_resource(show_spinner=False)
+def load_demo_ranking(count, seed):
+    return GradeRanking(load_demo_dataset(count, seed))
+
+# Aggregate the demo dataset's statistics per school, grade and term once
+@st.cache_resource(show_spinner=False)
+def load_demo_aggregates(count, seed):
+    return build_aggregate_store(load_demo_dataset(count, seed))
+
+student_dataset = load_demo_dataset(demo_students, demo_seed)
+grade_ranking = load_demo_ranking(demo_students, demo_seed)
+aggregates = load_demo_aggregates(demo_students, demo_seed)
 
 # Streamlit app
 st.set_page_config(
@@ -47,158 +47,145 @@ st.title("ScholarSense")
 # Sidebar menu to choose reports
 report_choice = st.sidebar.radio("Choose Report:", ("STUDENT PROFILES", "SUBJECT ANALYSIS", "PATHWAY ANALYSIS", "GRADE COMPARISON"))
 
-# Function to generate and display a radar chart
-def generate_radar_chart(student, title):
-    subject_scores = student["Subjects"]
-    values = [subject_scores.get(subject, 0) for subject in subjects]
-
-    fig = go.Figure()
-
-    fig.add_trace(go.Scatterpolar(
-        r=values,
-        theta=subjects,
-        fill='toself',
-        name=student['Name']
-    ))
-
-    fig.update_layout(
-        polar=dict(
-            radialaxis=dict(
-                visible=True,
-                range=[50, 100]  # Set the range of the radar chart
-            ),
-        ),
-        showlegend=True,
-        title=title,
-        height=600,
-        width=800,
-    )
-
-    st.plotly_chart(fig)
-
-# Function to generate and display a subject analysis report
-def generate_subject_analysis(students):
-    subject_data = {subject: [] for subject in subjects}
-    for student in students:
-        for subject, score in student["Subjects"].items():
-            subject_data[subject].append(score)
+# Function to generate and display a subject analysis report, from precomputed
+# aggregates when given or by scanning the students
+def generate_subject_analysis(dataset, subject_data=None):
+    if subject_data is None:
+        subject_data = compute_subject_analysis(dataset)
 
     show_details = st.checkbox("Show Subject Details")
 
-    for subject, scores in subject_data.items():
+    for subject, summary in subject_data.items():
         st.subheader(f"{subject} Analysis")
-        st.write(f"Average Score: {sum(scores) / len(scores):.2f}")
-        st.write(f"Minimum Score: {min(scores)}")
-        st.write(f"Maximum Score: {max(scores)}")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']}")
+        st.write(f"Maximum Score: {summary['max']}")
+        st.write(f"Standard Deviation: {summary['std']:.2f}")
+        st.write(f"Median Score: {summary['quartiles'][1]}")
+        st.write(f"Interquartile Range: {summary['quartiles'][0]} - {summary['quartiles'][2]}")
 
         if show_details:
             # Plot the score distribution for the subject
-            fig = go.Figure(data=[go.Histogram(x=scores, nbinsx=10)])
-            fig.update_layout(
-                title=f"{subject} Score Distribution",
-                xaxis_title="Score",
-                yaxis_title="Count",
-            )
+            fig = histogram_figure(summary["scores"], f"{subject} Score Distribution", "Score", weights=summary.get("weights"))
             st.plotly_chart(fig)
 
 # Function to generate and display a pathway analysis report
-def generate_pathway_analysis(students):
-    pathway_data = {pathway: [] for pathway in pathways}
-
-    for student in students:
-        student_subjects = set(subject for subject, score in student["Subjects"].items() if score >= 70)
-        for pathway, required_subjects in pathways.items():
-            if set(required_subjects).issubset(student_subjects):
-                pathway_data[pathway].append(student)
+def generate_pathway_analysis(dataset):
+    with st.sidebar.expander("Pathway Thresholds"):
+        thresholds = {
+            pathway: st.number_input(f"{pathway} minimum score", 0, 100, pathway_thresholds[pathway])
+            for pathway in pathways
+        }
+    pathway_data = compute_pathway_analysis(dataset, pathways, thresholds)
 
     show_details = st.checkbox("Show Pathway Details")
 
-    for pathway, students_in_pathway in pathway_data.items():
+    for pathway, rows in pathway_data.items():
         st.subheader(f"{pathway} Pathway")
+        st.write(f"Students: {len(rows)}")
 
         if show_details:
-            for student in students_in_pathway:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {student['Subjects'][subject]}' for subject in pathways[pathway]])}")
+            columns = ["Name", "School", *pathways[pathway], "Overall"]
+            show_student_table(dataset_table(f"{pathway} Pathway", dataset, rows, columns), f"{pathway} Pathway")
 
             # Plot radar charts for students in the pathway
-            for student in students_in_pathway:
-                generate_radar_chart(student, f"{pathway} Pathway - {student['Name']}")
-
-# Function to generate and display a grade comparison report
-def generate_grade_comparison(students):
-    grade_data = {}
-    for student in students:
-        grade = student["Grade"]
-        if grade not in grade_data:
-            grade_data[grade] = []
-        grade_data[grade].append(student)
+            generate_radar_drilldown(dataset, rows, rows, f"{pathway} Pathway")
+
+# Function to generate and display a grade comparison report. The per-grade
+# statistics come from precomputed aggregates when given; the student lists
+# always come from the ranking.
+def generate_grade_comparison(dataset, ranking=None, grade_stats=None):
+    if ranking is None:
+        ranking = GradeRanking(dataset)
+    with st.sidebar.expander("Grade Thresholds"):
+        at_risk = st.number_input("At-risk below overall score", 0, 100, at_risk_score)
+        excelling = st.number_input("Excelling from overall score", 0, 100, excelling_score)
+        top_count = st.number_input("Top and bottom students per grade", 1, 100, ranking_count)
+    grade_data = compute_grade_comparison(dataset, at_risk, excelling, ranking)
+    if grade_stats is None:
+        grade_stats = grade_data
+    overall = ranking.overall
+    columns = ["Name", "School", *dataset.subjects, "Overall"]
 
     show_details = st.checkbox("Show Grade Details")
     show_at_risk = st.checkbox("Show At-Risk Students")
     show_excelling = st.checkbox("Show Excelling Students")
+    show_ranking = st.checkbox("Show Top and Bottom Students")
 
-    for grade, students_in_grade in grade_data.items():
+    for grade, summary in grade_stats.items():
+        students = grade_data.get(grade)
         st.subheader(f"Grade {grade} Performance Analysis")
 
-        # Calculate the overall score for each student
-        student_scores = [sum(student["Subjects"].values()) / len(subjects) for student in students_in_grade]
-
         # Plot the score distribution for the grade
-        fig = go.Figure(data=[go.Histogram(x=student_scores, nbinsx=10)])
-        fig.update_layout(
-            title=f"Grade {grade} Score Distribution",
-            xaxis_title="Overall Score",
-            yaxis_title="Count",
-        )
+        fig = histogram_figure(summary["scores"], f"Grade {grade} Score Distribution", "Overall Score", weights=summary.get("weights"))
         st.plotly_chart(fig)
 
         # Display grade performance summary
         st.write("**Grade Performance Summary:**")
-        st.write(f"Average Score: {sum(student_scores) / len(student_scores):.2f}")
-        st.write(f"Minimum Score: {min(student_scores)}")
-        st.write(f"Maximum Score: {max(student_scores)}")
+        st.write(f"Average Score: {summary['average']:.2f}")
+        st.write(f"Minimum Score: {summary['min']:.2f}")
+        st.write(f"Maximum Score: {summary['max']:.2f}")
+        st.write(f"Median Score: {summary['quartiles'][1]:.2f}")
+        st.write(f"Interquartile Range: {summary['quartiles'][0]:.2f} - {summary['quartiles'][2]:.2f}")
+
+        # The statistics may cover a grade with no ranked students to list
+        if students is None:
+            continue
 
         if show_details:
             # Display student details and radar charts
             st.write("**Student Details:**")
-            for student in students_in_grade:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
-                generate_radar_chart(student, f"Grade {grade} - {student['Name']}")
+            show_student_table(dataset_table(f"Grade {grade}", dataset, students["rows"], columns), f"Grade {grade}")
+            generate_radar_drilldown(dataset, students["rows"], students["rows"], f"Grade {grade}")
 
         if show_at_risk:
-            st.write("**At-Risk Students:**")
-            at_risk_students = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) < 60]
-            for student in at_risk_students:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
+            st.write(f"**At-Risk Students ({len(students['at_risk']):,}):**")
+            show_student_table(dataset_table(f"Grade {grade} at-risk", dataset, students["at_risk"], columns), f"Grade {grade} at-risk")
 
         if show_excelling:
-            st.write("**Excelling Students:**")
-            excelling_students = [student for student in students_in_grade if sum(student["Subjects"].values()) / len(subjects) >= 90]
-            for student in excelling_students:
-                st.write(f"{student['Name']}: {', '.join([f'{subject}: {score}' for subject, score in student['Subjects'].items()])}")
+            st.write(f"**Excelling Students ({len(students['excelling']):,}):**")
+            show_student_table(dataset_table(f"Grade {grade} excelling", dataset, students["excelling"], columns), f"Grade {grade} excelling")
+
+        if show_ranking:
+            st.write(f"**Top {top_count} Students:**")
+            for row in ranking.top(grade, top_count):
+                st.write(f"{dataset.names[row]}: {overall[row]:.2f}")
+            st.write(f"**Bottom {top_count} Students:**")
+            for row in ranking.bottom(grade, top_count):
+                st.write(f"{dataset.names[row]}: {overall[row]:.2f}")
 
 if report_choice == "STUDENT PROFILES":
     # Create a dropdown menu to select students
-    selected_student_index = st.selectbox("Select a Student:", range(len(random_students)))
-    selected_student = random_students[selected_student_index]
+    selected_student_index = st.selectbox("Select a Student:", range(len(student_dataset)))
+    selected_student = student_dataset.record(selected_student_index)
 
     # Display selected student details
     st.write(f"**STUDENT:** {selected_student['Name']}")
     st.write(f"**AGE:** {selected_student['Age']}")
     st.write(f"**GRADE:** {selected_student['Grade']}")
+    st.write(f"**GRADE RANK:** {student_dataset.columns['Grade Rank'][selected_student_index]:,} ({student_dataset.columns['Grade Percentile'][selected_student_index]:.1f}th percentile)")
     st.write(f"**SCHOOL:** {selected_student['School']}")
 
+    # Place each subject score among the student's grade nationally and in their school
+    grade = selected_student['Grade']
+    student_scores = student_dataset.scores[selected_student_index]
+    national = aggregates.subject_percentiles(aggregates.select(min_grade=grade, max_grade=grade), student_scores)
+    in_school = aggregates.subject_percentiles(aggregates.select(selected_student['School'], grade, grade), student_scores)
+    st.write("**SUBJECT PERCENTILES:**")
+    for subject, score in selected_student['Subjects'].items():
+        st.write(f"{subject}: {score} ({national[subject]:.1f}th percentile nationally, {in_school[subject]:.1f}th in school)")
+
     # Generate and display radar chart for the selected student
-    generate_radar_chart(selected_student, f"Subject Radar Chart for {selected_student['Name']}")
+    generate_radar_chart(selected_student, subjects, f"Subject Radar Chart for {selected_student['Name']}")
 
 elif report_choice == "SUBJECT ANALYSIS":
     # Generate and display subject analysis report
-    generate_subject_analysis(random_students)
+    generate_subject_analysis(student_dataset, aggregates.subject_analysis())
 
 elif report_choice == "PATHWAY ANALYSIS":
     # Generate and display pathway analysis report
-    generate_pathway_analysis(random_students)
+    generate_pathway_analysis(student_dataset)
 
 elif report_choice == "GRADE COMPARISON":
     # Generate and display grade comparison report
-    generate_grade_comparison(random_students)
\ No newline at end of file
+    generate_grade_comparison(student_dataset, grade_ranking, aggregates.grade_comparison())
\ No newline at end of file
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Strings copied per chunk when a subset is given a buffer of its own, which
+# bounds the byte positions the copy needs
+gather_strings = 65_536
+
+
+# Strings stored end to end in one UTF-8 byte buffer, the i-th string being
+# buffer[offsets[i]:offsets[i + 1]]. This costs the encoded bytes plus one offset
+# per string, instead of a Python string object and a pointer for each. A run of
+# consecutive strings is a view sharing the buffer, with offsets[0] > 0. Any
+# other subset is a view too: it keeps the buffer and offsets and lists which of
+# their strings it holds in rows, so taking a subset copies no string bytes.
+class PackedStrings:
+    def __init__(self, buffer, offsets, rows=None):
+        self.buffer = buffer
+        self.offsets = offsets
+        self.rows = rows
+
+    # Function to pack a sequence of strings
+    @classmethod
+    def from_strings(cls, strings):
+        encoded = [str(string).encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    # Function to join several packed sequences into one
+    @classmethod
+    def concatenate(cls, parts):
+        parts = [part.compact() for part in parts]
+        lengths = np.concatenate([np.diff(part.offsets) for part in parts])
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        return cls(np.concatenate([part.used_bytes() for part in parts]), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1 if self.rows is None else len(self.rows)
+
+    # Function to get where every string starts and ends in the buffer
+    def bounds(self):
+        if self.rows is None:
+            return self.offsets[:-1], self.offsets[1:]
+        return self.offsets[self.rows], self.offsets[self.rows + 1]
+
+    # Function to get one string by position, or a packed subset by index array,
+    # boolean mask or slice
+    def __getitem__(self, selection):
+        if isinstance(selection, (int, np.integer)):
+            row = selection if self.rows is None else self.rows[selection]
+            return self.buffer[self.offsets[row]:self.offsets[row + 1]].tobytes().decode()
+        return self.take(selection)
+
+    # Function to view a subset of the strings, sharing the buffer: a slice of
+    # consecutive strings narrows the offsets and any other selection lists its rows
+    def take(self, selection):
+        if self.rows is not None:
+            return PackedStrings(self.buffer, self.offsets, self.rows[selection])
+        if isinstance(selection, slice) and selection.step in (None, 1):
+            start, stop, _ = selection.indices(len(self))
+            return PackedStrings(self.buffer, self.offsets[start:max(start, stop) + 1])
+        if isinstance(selection, np.ndarray) and selection.dtype == bool:
+            return PackedStrings(self.buffer, self.offsets, np.flatnonzero(selection))
+        return PackedStrings(self.buffer, self.offsets, np.arange(len(self))[selection])
+
+    # Function to copy the strings of a subset into a buffer of their own. Each
+    # chunk of strings is gathered in one go, so the byte positions the copy needs
+    # stay small however many strings there are.
+    def compact(self):
+        if self.rows is None:
+            return self
+        starts, stops = self.bounds()
+        lengths = stops - starts
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        buffer = np.empty(offsets[-1], dtype=np.uint8)
+        for first in range(0, len(lengths), gather_strings):
+            last = min(first + gather_strings, len(lengths))
+            # Position of every byte to copy: its string's start plus its place within the string
+            positions = np.repeat(starts[first:last] - offsets[first:last], lengths[first:last]) + np.arange(offsets[first], offsets[last])
+            buffer[offsets[first]:offsets[last]] = self.buffer[positions]
+        return PackedStrings(buffer, offsets)
+
+    # Function to get the bytes holding these strings end to end
+    def used_bytes(self):
+        packed = self.compact()
+        return packed.buffer[packed.offsets[0]:packed.offsets[-1]]
+
+    # Function to get the offsets of the strings within used_bytes()
+    def relative_offsets(self):
+        offsets = self.compact().offsets
+        return offsets - offsets[0] if offsets[0] else offsets
+
+    # Function to decode every string into a list
+    def tolist(self):
+        packed = self.compact()
+        data = packed.used_bytes().tobytes()
+        bounds = packed.relative_offsets().tolist()
+        return [data[start:stop].decode() for start, stop in zip(bounds[:-1], bounds[1:])]
+
+    # Function to number the distinct strings, returning each string's code and
+    # the number of codes. Strings of each length are compared as fixed-width
+    # byte values copied straight from the buffer, so no Python strings are made.
+    def factorize(self):
+        starts, stops = self.bounds()
+        lengths = stops - starts
+        codes = np.zeros(len(self), dtype=np.int64)
+        count = 0
+        for length in np.unique(lengths).tolist():
+            rows = np.flatnonzero(lengths == length)
+            if length == 0:
+                codes[rows] = count
+                count += 1
+                continue
+            values = np.lib.stride_tricks.sliding_window_view(self.buffer, length)[starts[rows]]
+            uniques, inverse = np.unique(values.view(f"S{length}").ravel(), return_inverse=True)
+            codes[rows] = count + inverse.ravel()
+            count += len(uniques)
+        return codes, count
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    # Function to get the bytes held by these strings; a subset listing its rows
+    # only holds the rows, the buffer belonging to the strings it was taken from
+    @property
+    def nbytes(self):
+        if self.rows is not None:
+            return self.rows.nbytes
+        return self.offsets[-1] - self.offsets[0] + self.offsets.nbytes
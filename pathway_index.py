@@ -0,0 +1,63 @@
+import numpy as np
+
+from student_dataset import present_scores
+
+# Minimum score a subject needs to count towards a pathway, unless overridden per pathway
+default_threshold = 70
+
+
+# Function to encode a list of subjects as a bitmask over the dataset's subject columns
+def subject_mask(subjects, required_subjects):
+    mask = 0
+    for subject in required_subjects:
+        mask |= 1 << subjects.index(subject)
+    return mask
+
+
+# Function to pick the smallest unsigned integer type holding one bit per subject
+def mask_dtype(subject_count):
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if subject_count <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError("bitmasks support at most 64 subjects")
+
+
+# Function to encode every student's passed subjects as one bitmask per student;
+# a missing score does not pass
+def passed_subject_masks(scores, threshold):
+    dtype = mask_dtype(scores.shape[1])
+    passed = (scores >= threshold) & present_scores(scores)
+    masks = np.zeros(len(scores), dtype=dtype)
+    for j in range(scores.shape[1]):
+        masks |= passed[:, j].astype(dtype) << dtype(j)
+    return masks
+
+
+# Pathway -> student index membership, computed in one pass per distinct threshold
+class PathwayIndex:
+    def __init__(self, dataset, pathways, thresholds=None):
+        dtype = mask_dtype(len(dataset.subjects))
+        thresholds = thresholds or {}
+        self.pathways = dict(pathways)
+        self.thresholds = {pathway: thresholds.get(pathway, default_threshold) for pathway in pathways}
+        self.masks = {
+            pathway: dtype(subject_mask(dataset.subjects, required_subjects))
+            for pathway, required_subjects in pathways.items()
+        }
+
+        student_masks = {
+            threshold: passed_subject_masks(dataset.scores, threshold)
+            for threshold in set(self.thresholds.values())
+        }
+        self.members = {}
+        for pathway, mask in self.masks.items():
+            passed = student_masks[self.thresholds[pathway]]
+            self.members[pathway] = np.flatnonzero((passed & mask) == mask)
+
+    # Function to get the row indices of the students in a pathway
+    def students(self, pathway):
+        return self.members[pathway]
+
+    # Function to count the students in every pathway
+    def counts(self):
+        return {pathway: len(rows) for pathway, rows in self.members.items()}
@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+
+import dataset_cache
+from student_dataset import float_scores, present_scores
+from student_timeline import StudentTimeline
+
+# Ridge penalty applied to every coefficient except the intercept
+default_alpha = 1.0
+
+
+# Function to build the model inputs for every student: an intercept, the current
+# per-subject scores, Age, Grade and Term. A missing score is NaN, so it makes
+# the student's predictions NaN rather than counting as a score.
+def prediction_features(dataset):
+    subject_count = len(dataset.subjects)
+    features = np.empty((len(dataset), subject_count + 4))
+    features[:, 0] = 1
+    features[:, 1:subject_count + 1] = float_scores(dataset.scores)
+    for i, column in enumerate(("Age", "Grade", "Term")):
+        features[:, subject_count + 1 + i] = dataset.columns[column]
+    return features
+
+
+# Function to get the rows of the students with every score, the only ones the
+# model is trained on and can predict for
+def complete_rows(dataset):
+    return np.flatnonzero(present_scores(dataset.scores).all(axis=1))
+
+
+# Function to pair each student's row with their row in the following term,
+# identifying students by name and school. Only pairs where both rows have every
+# score are kept, so missing scores never enter the model. Returns (current
+# rows, next rows).
+def next_term_pairs(dataset):
+    current, following = StudentTimeline(dataset).next_term_pairs()
+    complete = present_scores(dataset.scores).all(axis=1)
+    keep = complete[current] & complete[following]
+    return current[keep], following[keep]
+
+
+# Ridge regression from this term's features to next term's per-subject scores,
+# fitted in closed form. Only X^T X and X^T Y are kept, so new transitions can be
+# added later without revisiting the old ones.
+class ScorePredictor:
+    def __init__(self, subjects, alpha=default_alpha):
+        self.subjects = list(subjects)
+        self.alpha = alpha
+        size = len(self.subjects) + 4
+        self.xtx = np.zeros((size, size))
+        self.xty = np.zeros((size, len(self.subjects)))
+        self.count = 0
+        self.coef = None
+
+    # Function to add training rows and re-solve for the coefficients
+    def partial_fit(self, features, targets):
+        self.xtx += features.T @ features
+        self.xty += features.T @ np.asarray(targets, dtype=np.float64)
+        self.count += len(features)
+        return self.solve()
+
+    # Function to solve the regularised normal equations for the coefficients
+    def solve(self):
+        if self.count:
+            penalty = self.alpha * np.eye(len(self.xtx))
+            penalty[0, 0] = 0
+            self.coef = np.linalg.solve(self.xtx + penalty, self.xty)
+        return self
+
+    # Function to predict next term's per-subject scores for a batch of feature rows
+    def predict(self, features):
+        return np.clip(features @ self.coef, 0, 100)
+
+    def save(self, path):
+        np.savez(path, xtx=self.xtx, xty=self.xty, count=self.count, alpha=self.alpha, subjects=np.array(self.subjects))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            predictor = cls([str(subject) for subject in stored["subjects"]], float(stored["alpha"]))
+            predictor.xtx = stored["xtx"]
+            predictor.xty = stored["xty"]
+            predictor.count = int(stored["count"])
+        return predictor.solve()
+
+
+# Function to fit a predictor on every term-to-term transition in a dataset
+def train_predictor(dataset, alpha=default_alpha):
+    current, following = next_term_pairs(dataset)
+    features = prediction_features(dataset)
+    return ScorePredictor(dataset.subjects, alpha).partial_fit(features[current], dataset.scores[following])
+
+
+# Function to add the transitions involving rows appended after previous_length,
+# so a new term can be folded in without refitting on the older ones
+def update_predictor(predictor, dataset, previous_length):
+    current, following = next_term_pairs(dataset)
+    new = (current >= previous_length) | (following >= previous_length)
+    features = prediction_features(dataset.take(current[new]))
+    return predictor.partial_fit(features, dataset.scores[following[new]])
+
+
+# Function to get the path a dataset's trained coefficients are cached under
+def model_path(key):
+    return os.path.join(dataset_cache.cache_dir, "models", f"{key}.npz")
+
+
+# Function to load a dataset's predictor from the disk cache, training and caching it if needed
+def load_or_train_predictor(dataset, key=None, alpha=default_alpha):
+    path = model_path(key or dataset_cache.dataset_fingerprint(dataset))
+    if os.path.exists(path):
+        predictor = ScorePredictor.load(path)
+        if predictor.alpha == alpha and predictor.subjects == dataset.subjects:
+            dataset_cache.touch(path)
+            return predictor
+    predictor = train_predictor(dataset, alpha)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    predictor.save(path)
+    dataset_cache.evict(keep=path)
+    return predictor
+
+
+# Function to fold a newly appended term into a cached predictor and cache the
+# result under the combined dataset's key
+def append_term(predictor, dataset, previous_length, key=None):
+    predictor = update_predictor(predictor, dataset, previous_length)
+    path = model_path(key or dataset_cache.dataset_fingerprint(dataset))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    predictor.save(path)
+    dataset_cache.evict(keep=path)
+    return predictor
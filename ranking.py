@@ -0,0 +1,110 @@
+import numpy as np
+
+
+# Function to compute every student's overall score, the mean of their present
+# scores, from their score totals and the number of subjects scored. A student
+# with no scores at all has no overall score (NaN).
+def overall_scores(totals, counts):
+    return np.divide(totals, counts, out=np.full(len(totals), np.nan), where=counts > 0)
+
+
+# Function to find, for each position of a sorted array, where its run of equal
+# values starts and stops
+def run_bounds(sorted_values):
+    count = len(sorted_values)
+    positions = np.arange(count)
+    changes = np.empty(count, dtype=bool)
+    changes[:1] = True
+    np.not_equal(sorted_values[1:], sorted_values[:-1], out=changes[1:])
+    starts = np.maximum.accumulate(np.where(changes, positions, 0))
+    ends = np.append(changes[1:], True)
+    stops = np.minimum.accumulate(np.where(ends, positions + 1, count)[::-1])[::-1]
+    return starts, stops
+
+
+# Function to compute every student's overall score, their competition rank
+# within their grade (1 is best, ties share a rank) and their percentile rank
+# within their grade (the share of grade peers below them, counting ties as
+# half). Students with no scores are not ranked: their rank is 0 and their
+# percentile NaN.
+def compute_rank_columns(totals, counts, grades):
+    overall = overall_scores(totals, counts)
+    ranked = np.flatnonzero(counts > 0)
+    # Sort by (grade, overall score) with one key, then read each student's grade
+    # and tie group off the runs of the sorted keys. Overall scores lie in
+    # [0, 100], so the grade term keeps grades apart; equal total / count ratios
+    # give equal keys and different ones differ far beyond rounding, so equal
+    # keys are exactly the ties within a grade.
+    keys = grades[ranked] * 101.0 + overall[ranked]
+    sort = np.argsort(keys)
+    order = ranked[sort]
+    grade_starts, grade_stops = run_bounds(grades[order])
+    tie_starts, tie_stops = run_bounds(keys[sort])
+    sizes = grade_stops - grade_starts
+    below = tie_starts - grade_starts
+    not_above = tie_stops - grade_starts
+
+    rank = np.zeros(len(totals), dtype=np.int32)
+    rank[order] = sizes - not_above + 1
+    percentile = np.full(len(totals), np.nan, dtype=np.float32)
+    percentile[order] = 100 * (below + (not_above - below) / 2) / np.maximum(sizes, 1)
+    return {
+        "Overall": overall.astype(np.float32),
+        "Grade Rank": rank,
+        "Grade Percentile": percentile,
+    }
+
+
+# Function to store the overall score, grade rank and grade percentile as dataset columns
+def add_rank_columns(dataset):
+    dataset.columns.update(compute_rank_columns(*dataset.score_totals(), dataset.columns["Grade"]))
+    return dataset
+
+
+# Students sorted by overall score within each grade. Built once, it answers
+# threshold lists and top/bottom N per grade with binary searches and slices,
+# so changing a threshold does not rescan the students. Students with no scores
+# have no overall score and are left out.
+class GradeRanking:
+    def __init__(self, dataset):
+        self.overall = dataset.columns.get("Overall")
+        if self.overall is None:
+            self.overall = overall_scores(*dataset.score_totals()).astype(np.float32)
+        grades = dataset.columns["Grade"]
+        self.order = np.lexsort((self.overall, grades))
+        self.order = self.order[~np.isnan(self.overall[self.order])]
+        self.sorted_overall = self.overall[self.order]
+        sorted_grades = grades[self.order]
+        grade_values, starts = np.unique(sorted_grades, return_index=True)
+        stops = np.append(starts[1:], len(sorted_grades))
+        self.bounds = {int(grade): (start, stop) for grade, start, stop in zip(grade_values, starts, stops)}
+
+    # Function to get a grade's rows, lowest overall score first
+    def rows(self, grade):
+        start, stop = self.bounds[grade]
+        return self.order[start:stop]
+
+    # Function to get a grade's overall scores in ascending order
+    def scores(self, grade):
+        start, stop = self.bounds[grade]
+        return self.sorted_overall[start:stop]
+
+    # Function to get the rows of a grade scoring below a threshold
+    def below(self, grade, threshold):
+        start, stop = self.bounds[grade]
+        return self.order[start:start + np.searchsorted(self.sorted_overall[start:stop], threshold, side="left")]
+
+    # Function to get the rows of a grade scoring at or above a threshold, best first
+    def at_least(self, grade, threshold):
+        start, stop = self.bounds[grade]
+        return self.order[start + np.searchsorted(self.sorted_overall[start:stop], threshold, side="left"):stop][::-1]
+
+    # Function to get the n best rows of a grade, best first
+    def top(self, grade, n):
+        start, stop = self.bounds[grade]
+        return self.order[max(start, stop - n):stop][::-1]
+
+    # Function to get the n worst rows of a grade, worst first
+    def bottom(self, grade, n):
+        start, stop = self.bounds[grade]
+        return self.order[start:min(stop, start + n)]
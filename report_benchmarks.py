@@ -0,0 +1,310 @@
+import argparse
+import importlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+
+import numpy as np
+import pandas as pd
+
+import dataset_cache
+from charts import figure_bytes
+from reports import subjects
+from synthetic_data import generate_dataset, write_csv
+
+# Dataset sizes run by default; pass --sizes to go up to 10M
+default_sizes = [1_000, 10_000, 100_000]
+
+# Files the CSV is split into for the multi-file load case
+split_files = 8
+
+# Where the stored baseline lives, and how much worse a result may be before it counts as a regression
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+default_tolerance = 0.25
+
+# Differences below these are treated as measurement noise rather than regressions
+noise_floor = {"seconds": 0.005, "peak_bytes": 2 ** 20}
+
+# Every how many rows a score is replaced by text in the invalid cells case
+invalid_every = 50
+
+# Checkboxes the stub ticks. Per-student listings are left off so large runs
+# measure the reports rather than millions of st.write calls.
+checked_boxes = {"Show Subject Details"}
+
+
+# Element returned by stubbed Streamlit calls: every method call, attribute and
+# context manager on it is a no-op
+class StubElement:
+    def __getattr__(self, name):
+        return self
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+# Stand-in for the streamlit module that renders nothing but counts the elements
+# a report emits and the bytes of every figure passed to st.plotly_chart
+class StreamlitStub(types.ModuleType):
+    def __init__(self):
+        super().__init__("streamlit")
+        self.sidebar = self
+        self.session_state = {}
+        self.reset()
+
+    def reset(self):
+        self.elements = 0
+        self.figures = 0
+        self.payload_bytes = 0
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        self.elements += 1
+        return StubElement()
+
+    def plotly_chart(self, fig, *args, **kwargs):
+        self.elements += 1
+        self.figures += 1
+        self.payload_bytes += figure_bytes(fig)
+
+    def checkbox(self, label, *args, **kwargs):
+        return label in checked_boxes
+
+    def radio(self, label, options, *args, **kwargs):
+        return options[0]
+
+    def selectbox(self, label, options, *args, **kwargs):
+        return options[0]
+
+    def number_input(self, label, *args, **kwargs):
+        return kwargs.get("value", args[2] if len(args) > 2 else args[0] if args else 0)
+
+    def slider(self, label, *args, **kwargs):
+        return kwargs.get("value", args[2] if len(args) > 2 else args[0] if args else 0)
+
+    def file_uploader(self, *args, **kwargs):
+        return None
+
+    def text_input(self, label, value="", *args, **kwargs):
+        return value
+
+    def cache_resource(self, function=None, **kwargs):
+        return function if function is not None else (lambda function: function)
+
+    cache_data = cache_resource
+
+
+# Function to import the upload app with Streamlit replaced by the stub. The
+# shared Streamlit helpers in student_table are imported afresh with it, so
+# what they draw is counted too.
+def load_app(stub):
+    real_streamlit = sys.modules.get("streamlit")
+    sys.modules["streamlit"] = stub
+    try:
+        sys.modules.pop("student_table", None)
+        sys.modules.pop("csv_load_data", None)
+        return importlib.import_module("csv_load_data")
+    finally:
+        if real_streamlit is not None:
+            sys.modules["streamlit"] = real_streamlit
+        else:
+            sys.modules.pop("streamlit")
+
+
+# Stand-in for a Streamlit UploadedFile
+class Upload(io.BytesIO):
+    def __init__(self, data, file_id):
+        super().__init__(data)
+        self.file_id = file_id
+        self.size = len(data)
+
+
+# Function to get the rows whose last score is replaced by text in the invalid
+# cells case: every invalid_every-th row of the second half, so the first chunks
+# parse as numbers before the reader falls back to text
+def invalid_rows(count):
+    return np.arange(count // 2, count, invalid_every)
+
+
+# Function to rewrite a wide CSV with the last subject's score of the invalid rows as text
+def invalid_csv(data, subjects):
+    frame = pd.read_csv(io.BytesIO(data))
+    frame[subjects[-1]] = frame[subjects[-1]].astype(object)
+    frame.loc[invalid_rows(len(frame)), subjects[-1]] = "absent"
+    return frame.to_csv(index=False).encode()
+
+
+# Function to rewrite a wide CSV in the long layout, as a frame. The second
+# student's second score is given as text, and the first student gets a row for
+# an unknown subject and a second score for their first subject.
+def long_frame(data, subjects):
+    frame = pd.read_csv(io.BytesIO(data))
+    long = frame.melt(
+        id_vars=[column for column in frame.columns if column not in subjects],
+        value_vars=subjects, var_name="Subject", value_name="Score",
+    )
+    long["Score"] = long["Score"].astype(object)
+    long.loc[len(frame) + 1, "Score"] = "absent"
+    extra = long.iloc[[0, 0]].copy()
+    extra["Subject"] = ["Latin", subjects[0]]
+    extra["Score"] = [50, 7]
+    return pd.concat([long, extra], ignore_index=True)
+
+
+# Function to build the (setup, run) pairs measured for one dataset size
+def report_cases(app, stub, dataset, csv_path, cache_dir):
+    with open(csv_path, "rb") as csv_file:
+        data = csv_file.read()
+    index = app.FilterIndex(dataset)
+    header, body = data.split(b"\n", 1)
+    lines = body.splitlines(keepends=True)
+    parts = [header + b"\n" + b"".join(lines[i::split_files]) for i in range(split_files)]
+    invalid = invalid_csv(data, dataset.subjects)
+    long_data = long_frame(data, dataset.subjects).to_csv(index=False).encode()
+    school = str(dataset.school_names[0])
+
+    def clear_cache():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        stub.session_state.clear()
+
+    def warm_cache():
+        stub.session_state.clear()
+        app.load_student_data([Upload(data, "warm")])
+
+    def no_setup():
+        pass
+
+    database = {}
+
+    def open_database():
+        database["sqlite"] = app.load_student_database([Upload(data, "sqlite")])
+
+    return {
+        "load_student_data (parse)": (clear_cache, lambda: app.load_student_data([Upload(data, "cold")])),
+        "load_student_data (cached)": (warm_cache, lambda: app.load_student_data([Upload(data, "warm")])),
+        f"load_student_data ({split_files} files)": (
+            clear_cache,
+            lambda: app.load_student_data([Upload(part, f"part {i}") for i, part in enumerate(parts)]),
+        ),
+        "load_student_data (invalid cells)": (clear_cache, lambda: app.load_student_data([Upload(invalid, "invalid")])),
+        "load_student_data (long format)": (clear_cache, lambda: app.load_student_data([Upload(long_data, "long")])),
+        "load_student_database (SQLite)": (clear_cache, lambda: app.load_student_database([Upload(data, "sqlite")])),
+        "filter index build": (no_setup, lambda: app.FilterIndex(dataset)),
+        "filter_students": (no_setup, lambda: app.filter_students(dataset, 13, 16, 9, 11, school, index=index)),
+        "student table page (sorted)": (
+            no_setup,
+            lambda: app.dataset_table("benchmark", dataset, np.arange(len(dataset)), ["Name", "School", *dataset.subjects, "Overall"]).page(sort="Overall", descending=True, size=50),
+        ),
+        "generate_subject_analysis": (no_setup, lambda: app.generate_subject_analysis(dataset)),
+        "generate_pathway_analysis": (no_setup, lambda: app.generate_pathway_analysis(dataset)),
+        "generate_grade_comparison": (no_setup, lambda: app.generate_grade_comparison(dataset)),
+        "subject analysis (SQLite)": (open_database, lambda: app.generate_subject_analysis(None, database["sqlite"].subject_analysis())),
+        "grade comparison (SQLite)": (open_database, lambda: app.generate_database_grade_comparison(database["sqlite"], {})),
+    }
+
+
+# Function to measure one case: best wall time over repeats, the figure payload
+# and element count of a run, and (optionally) peak traced memory of one more run
+def measure(stub, setup, run, repeat, trace_memory):
+    seconds = float("inf")
+    for _ in range(repeat):
+        setup()
+        stub.reset()
+        start = time.perf_counter()
+        run()
+        seconds = min(seconds, time.perf_counter() - start)
+    result = {"seconds": seconds, "payload_bytes": stub.payload_bytes, "elements": stub.elements}
+
+    if trace_memory:
+        setup()
+        tracemalloc.start()
+        try:
+            run()
+            result["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+# Function to run every case over every size, returning results keyed "case @ size"
+def run_suite(sizes, repeat=3, trace_memory=True, seed=0):
+    stub = StreamlitStub()
+    app = load_app(stub)
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        cache_dir = os.path.join(workdir, "cache")
+        dataset_cache.cache_dir = cache_dir
+        for size in sizes:
+            csv_path = os.path.join(workdir, f"students-{size}.csv")
+            write_csv(csv_path, size, seed, subjects)
+            dataset = generate_dataset(size, seed, subjects)
+            for case, (setup, run) in report_cases(app, stub, dataset, csv_path, cache_dir).items():
+                results[f"{case} @ {size}"] = result = measure(stub, setup, run, repeat, trace_memory)
+                peak = result.get("peak_bytes")
+                print(
+                    f"{case:<34}{size:>11,}{result['seconds']:>11.4f}"
+                    f"{'-' if peak is None else f'{peak / 2 ** 20:,.1f}':>12}"
+                    f"{result['payload_bytes']:>14,}{result['elements']:>10,}",
+                    flush=True,
+                )
+            os.remove(csv_path)
+    return results
+
+
+# Function to list the metrics that got worse than the baseline by more than the tolerance
+def find_regressions(results, baseline, tolerance):
+    regressions = []
+    for key, result in results.items():
+        for metric, value in result.items():
+            expected = baseline.get(key, {}).get(metric)
+            if expected is None or value - expected <= noise_floor.get(metric, 0):
+                continue
+            if value > expected * (1 + tolerance):
+                regressions.append(f"{key}: {metric} {value:,.4g} vs baseline {expected:,.4g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every report path headlessly over synthetic datasets.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run used to measure peak memory")
+    parser.add_argument("--baseline", default=baseline_path)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=default_tolerance)
+    args = parser.parse_args()
+
+    print(f"{'case':<34}{'students':>11}{'seconds':>11}{'peak (MiB)':>12}{'payload (B)':>14}{'elements':>10}")
+    results = run_suite(args.sizes, args.repeat, not args.no_memory)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = find_regressions(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Results kept per store before the least recently used finished ones are dropped
+max_results = 64
+
+
+# Function to check whether a computation finished by raising an error
+def failed(future):
+    return future.done() and not future.cancelled() and future.exception() is not None
+
+
+# Report data computed ahead of time by a background worker thread, so switching
+# between reports reads finished results instead of recomputing them. Results are
+# keyed by the report and the inputs they were computed from. Asking for a result
+# waits for it if the worker is computing it, and computes it in the caller's
+# thread if the worker has not started on it yet, so a request never queues
+# behind other reports. Errors are not kept: a computation that failed is run
+# again the next time it is asked for.
+class ReportStore:
+    def __init__(self, workers=1):
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="reports")
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.futures)
+
+    # Function to queue a computation for the worker, unless it is already queued or done
+    def submit(self, key, function, *args):
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None or failed(future):
+                future = self.futures[key] = self.executor.submit(function, *args)
+                self.evict()
+            self.futures.move_to_end(key)
+            return future
+
+    # Function to get a result, computing it here if the worker has not started it
+    def get(self, key, function, *args):
+        with self.lock:
+            future = self.futures.get(key)
+            compute = future is None or failed(future) or future.cancel()
+            if compute:
+                future = self.futures[key] = Future()
+                future.set_running_or_notify_cancel()
+                self.evict()
+            self.futures.move_to_end(key)
+        if compute:
+            try:
+                future.set_result(function(*args))
+            except BaseException as error:
+                future.set_exception(error)
+                self.discard(key, future)
+        return future.result()
+
+    # Function to drop a result, unless it has been replaced since
+    def discard(self, key, future):
+        with self.lock:
+            if self.futures.get(key) is future:
+                del self.futures[key]
+
+    # Function to count how many of the given results are finished
+    def progress(self, keys):
+        with self.lock:
+            futures = [self.futures.get(key) for key in keys]
+        return sum(future is not None and future.done() for future in futures)
+
+    # Function to drop the least recently used finished results beyond max_results
+    def evict(self):
+        excess = len(self.futures) - max_results
+        for key in [key for key, future in self.futures.items() if future.done()][:max(excess, 0)]:
+            del self.futures[key]
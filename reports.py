@@ -0,0 +1,79 @@
+import numpy as np
+
+from pathway_index import PathwayIndex, default_threshold
+from aggregate_store import histogram_summary, overall_average, report_quantiles, score_values
+from ranking import GradeRanking
+from student_dataset import missing_score
+
+# Subjects every student is scored in, shared by the apps, the batch reports and the benchmarks
+subjects = ["English Language", "Social Studies", "Mathematics", "Integrated Science", "Zambian Languages", "Creative and Technology Studies"]
+
+# Student pathways and the subjects each one requires
+pathways = {
+    "STEM": ["Mathematics", "Integrated Science"],
+    "Humanities and Social Sciences": ["English Language", "Social Studies"],
+    "Linguistic and Cultural Studies": ["Zambian Languages", "English Language"],
+    "Creative and Design": ["Creative and Technology Studies"],
+}
+
+# Minimum score a student needs in every subject of a pathway
+pathway_thresholds = {pathway: default_threshold for pathway in pathways}
+
+# Thresholds used by the grade report
+at_risk_score = 60
+excelling_score = 90
+
+
+# Function to group row indices by the distinct values of a column
+def group_rows(values):
+    order = np.argsort(values, kind="stable")
+    keys, starts = np.unique(values[order], return_index=True)
+    return {int(key): rows for key, rows in zip(keys, np.split(order, starts[1:]))}
+
+
+# Function to compute per-subject score statistics over the present scores,
+# leaving out subjects nobody has a score in
+def compute_subject_analysis(dataset):
+    subject_data = {}
+    values = np.arange(score_values)
+    for j, subject in enumerate(dataset.subjects):
+        scores = dataset.scores[:, j]
+        counts = np.bincount(scores, minlength=missing_score + 1)[:score_values]
+        if counts.sum() < len(scores):
+            scores = scores[scores != missing_score]
+        if len(scores):
+            subject_data[subject] = {"scores": scores, **histogram_summary(values, counts)}
+    return subject_data
+
+
+# Function to find the students who pass every subject of each pathway
+def compute_pathway_analysis(dataset, pathways, thresholds=None):
+    return PathwayIndex(dataset, pathways, thresholds).members
+
+
+# Function to compute overall score statistics and at-risk/excelling lists per grade.
+# Rows and scores come back sorted by overall score; pass a GradeRanking built
+# once for the dataset to change the thresholds without sorting again.
+def compute_grade_comparison(dataset, at_risk=at_risk_score, excelling=excelling_score, ranking=None):
+    if ranking is None:
+        ranking = GradeRanking(dataset)
+    subject_count = len(dataset.subjects)
+    # Averages come from the exact whole-number totals, grouped by how many
+    # subjects the students are scored in
+    totals, counts = dataset.score_totals()
+    grade_data = {}
+    for grade in ranking.bounds:
+        rows = ranking.rows(grade)
+        student_scores = ranking.scores(grade)
+        count_totals = np.bincount(counts[rows], weights=totals[rows], minlength=subject_count + 1)
+        grade_data[grade] = {
+            "rows": rows[::-1],
+            "scores": student_scores,
+            "average": overall_average(count_totals, len(rows)),
+            "min": float(student_scores[0]),
+            "max": float(student_scores[-1]),
+            "quartiles": np.quantile(student_scores, report_quantiles, method="inverted_cdf").tolist(),
+            "at_risk": ranking.below(grade, at_risk),
+            "excelling": ranking.at_least(grade, excelling),
+        }
+    return grade_data
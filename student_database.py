@@ -0,0 +1,340 @@
+import os
+import sqlite3
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+import dataset_cache
+from aggregate_store import histogram_percentile, histogram_summary, overall_bins, overall_summary, score_values
+from csv_ingest import opened, source_name, validated_chunks
+from csv_schema import ValidationErrors, student_key
+from pathway_index import default_threshold
+from ranking import overall_scores
+from student_dataset import StudentDataset, info_columns, missing_score, present_scores
+
+# Bump when the table layout changes so old database files are rebuilt
+database_format = 3
+
+# Rows inserted per transaction while loading
+insert_rows = 50_000
+
+
+# Locks held while a database file is built, one per path
+building = {}
+building_lock = threading.Lock()
+
+
+# Function to quote a column name for SQL
+def quoted(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+# Function to get the path a dataset's database file is kept under
+def database_path(key):
+    return os.path.join(dataset_cache.cache_dir, "sqlite", f"{key}-{database_format}.db")
+
+
+# Function to create the students table: one row per student with the per-subject
+# scores (NULL when missing), the info columns, the total of the present scores,
+# the number of subjects scored and the overall score (NULL without any score),
+# plus the file each row came from
+def create_table(connection, subjects):
+    columns = ", ".join(
+        ["id INTEGER PRIMARY KEY", "name TEXT", "school TEXT", "file INTEGER", "total INTEGER", "scored INTEGER", "overall REAL"]
+        + [f"{quoted(column)} INTEGER" for column in info_columns]
+        + [f"{quoted(subject)} INTEGER" for subject in subjects]
+    )
+    connection.execute(f"CREATE TABLE students ({columns})")
+
+
+# Function to insert one parsed chunk of students
+def insert_dataset(connection, dataset, file):
+    columns = ["name", "school", "file", "total", "scored", "overall"] + list(info_columns) + list(dataset.subjects)
+    statement = f"INSERT INTO students ({', '.join(quoted(column) for column in columns)}) VALUES ({', '.join('?' * len(columns))})"
+    names = dataset.names.tolist()
+    schools = [str(school) for school in dataset.school_names[dataset.school_codes]]
+    totals, scored = dataset.score_totals()
+    overall = overall_scores(totals, scored).astype(object)
+    overall[scored == 0] = None
+    scores = dataset.scores.astype(object)
+    scores[~present_scores(dataset.scores)] = None
+    summaries = np.column_stack([totals, scored, overall]).tolist()
+    numbers = np.column_stack([dataset.columns[column] for column in info_columns] + [scores]).tolist()
+    for start in range(0, len(names), insert_rows):
+        stop = start + insert_rows
+        connection.executemany(statement, (
+            (name, school, file, *summary, *values)
+            for name, school, summary, values in zip(names[start:stop], schools[start:stop], summaries[start:stop], numbers[start:stop])
+        ))
+
+
+# Function to insert one chunk of validated long-layout rows (see
+# csv_schema.long_rows) into the long_rows table. SQLite stores the NaN of
+# blank cells as NULL.
+def insert_long_rows(connection, rows):
+    statement = f"INSERT INTO long_rows VALUES ({', '.join('?' * len(rows.columns))})"
+    columns = [rows[column].to_numpy().tolist() for column in rows.columns]
+    for start in range(0, len(rows), insert_rows):
+        connection.executemany(statement, zip(*(column[start:start + insert_rows] for column in columns)))
+
+
+# Function to pivot the rows in the long_rows table into students, the way
+# csv_schema.LongPivot does in memory: rows are grouped by the student key in
+# order of first appearance, each student keeps the info columns of their first
+# row and the last score given for each subject, and the earlier scores are
+# recorded in errors. An index on the key lets both queries walk the rows in key
+# order without sorting them. Yields the students as wide-layout frames,
+# insert_rows at a time.
+def pivot_long_rows(connection, subjects, errors, file):
+    key = [{"Name": "name", "School": "school"}.get(column, quoted(column)) for column in student_key]
+    connection.execute(f"CREATE INDEX long_rows_key ON long_rows ({', '.join(key)}, subject, line, score)")
+    same_subject = " AND ".join(f"later.{column} IS long_rows.{column}" for column in [*key, "subject"])
+    repeated = connection.execute(f"""
+        SELECT line, subject FROM long_rows WHERE subject >= 0 AND EXISTS (
+            SELECT 1 FROM long_rows AS later WHERE {same_subject} AND later.line > long_rows.line
+        )
+    """).fetchall()
+    if repeated:
+        lines, codes = np.array(repeated, dtype=np.int64).T
+        errors.add(
+            file, lines, "Subject", np.array(subjects, dtype=object)[codes],
+            np.ones(len(lines), dtype=bool), "repeated for the student; the last score is used",
+        )
+
+    # The last score of each subject is the one on the highest line, so it is
+    # packed below the line number (a blank as 511) and picked out with MAX
+    scores = [
+        f"NULLIF(MAX(CASE WHEN subject = {j} THEN line * 512 + IFNULL(score, 511) END) % 512, 511)"
+        for j in range(len(subjects))
+    ]
+    first = ", ".join(f"first.{column}" for column in ["name", "school", *map(quoted, info_columns)])
+    cursor = connection.execute(f"""
+        SELECT {first}, students.* FROM (
+            SELECT MIN(line) AS first_line, {', '.join(scores)} FROM long_rows GROUP BY {', '.join(key)}
+        ) AS students JOIN long_rows AS first ON first.line = students.first_line
+        ORDER BY students.first_line
+    """)
+    columns = ["Name", "School", *info_columns, "first_line", *subjects]
+    while students := cursor.fetchmany(insert_rows):
+        yield pd.DataFrame.from_records(students, columns=columns, coerce_float=True).drop(columns="first_line")
+
+
+# Function to load student CSVs into a database file one chunk at a time, so
+# files larger than memory can be loaded. Files in the long layout are loaded
+# row by row into a temporary table and pivoted in SQL. Students repeated across
+# files for the same term keep the row from the last file, as
+# csv_ingest.load_csvs does. Problem cells are read as blank and listed in an
+# errors table. progress is called after every chunk with the students loaded
+# so far.
+def load_database(sources, subjects, path, progress=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Build under a unique hidden name and rename it, so readers never open a partial file
+    handle, staging = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", suffix=".tmp", dir=os.path.dirname(path))
+    os.close(handle)
+    connection = sqlite3.connect(staging)
+    try:
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        create_table(connection, subjects)
+        errors = ValidationErrors()
+        rows = 0
+        for file, source in enumerate(sources):
+            with opened(source) as stream:
+                long_format, frames = validated_chunks(stream, subjects, errors, source_name(source))
+                if long_format:
+                    columns = ", ".join(["line INTEGER PRIMARY KEY", "name TEXT", "school TEXT"] + [f"{quoted(column)} INTEGER" for column in info_columns] + ["subject INTEGER", "score INTEGER"])
+                    connection.execute(f"CREATE TEMP TABLE long_rows ({columns})")
+                    for chunk in frames:
+                        insert_long_rows(connection, chunk)
+                        connection.commit()
+                    frames = pivot_long_rows(connection, subjects, errors, source_name(source))
+                for frame in frames:
+                    insert_dataset(connection, StudentDataset.from_frame(frame, subjects), file)
+                    connection.commit()
+                    rows += len(frame)
+                    if progress is not None:
+                        progress(rows)
+                if long_format:
+                    connection.execute("DROP TABLE long_rows")
+        errors.to_frame().to_sql("errors", connection, index=False)
+
+        # Indexes for the student timelines (and the de-duplication), the filters
+        # and the grade rankings
+        connection.execute('CREATE INDEX students_name ON students (school, name, "Grade", "Term")')
+        if len(sources) > 1:
+            connection.execute("""
+                DELETE FROM students WHERE id IN (
+                    SELECT students.id FROM students JOIN (
+                        SELECT school, name, "Grade", "Term", MAX(file) AS last_file FROM students
+                        GROUP BY 1, 2, 3, 4 HAVING MIN(file) < MAX(file)
+                    ) AS repeated USING (school, name, "Grade", "Term")
+                    WHERE students.file < repeated.last_file
+                )
+            """)
+        connection.execute('CREATE INDEX students_grade ON students ("Grade", overall)')
+        connection.execute('CREATE INDEX students_age ON students ("Age")')
+        connection.execute('CREATE INDEX students_school ON students (school, "Grade")')
+        connection.commit()
+    except BaseException:
+        connection.close()
+        os.remove(staging)
+        raise
+    connection.close()
+    os.replace(staging, path)
+
+
+# Function to build the database file for a set of sources unless it exists. One
+# caller builds it while others asking for the same path wait for that build
+# rather than starting their own.
+def build_database(sources, subjects, path, progress=None):
+    with building_lock:
+        lock = building.setdefault(path, threading.Lock())
+    with lock:
+        if os.path.exists(path):
+            dataset_cache.touch(path)
+        else:
+            load_database(sources, subjects, path, progress)
+            dataset_cache.evict(keep=path)
+    return path
+
+
+# A student dataset kept in an on-disk SQLite database. The report statistics are
+# computed by grouped SQL queries that return score counts, and the figures are
+# derived from those counts with the same functions the in-memory reports use,
+# so both give identical results.
+class StudentDatabase:
+    def __init__(self, path, subjects):
+        self.path = path
+        self.subjects = list(subjects)
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+
+    # Function to build the WHERE clause and parameters for the sidebar filters
+    def where(self, min_age=None, max_age=None, min_grade=None, max_grade=None, school=None):
+        conditions, params = [], []
+        for column, low, high in (("Age", min_age, max_age), ("Grade", min_grade, max_grade)):
+            if low is not None:
+                conditions.append(f"{quoted(column)} >= ?")
+                params.append(int(low))
+            if high is not None:
+                conditions.append(f"{quoted(column)} <= ?")
+                params.append(int(high))
+        if school and school != "All":
+            conditions.append("school = ?")
+            params.append(school)
+        return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+    # Function to build the WHERE clause and parameters for the sidebar filters
+    # and an extra condition
+    def where_condition(self, condition="", condition_params=(), **criteria):
+        where, params = self.where(**criteria)
+        if condition:
+            where = f"{where} AND {condition}" if where else f" WHERE {condition}"
+            params = params + list(condition_params)
+        return where, params
+
+    # Function to run a query and return all its rows
+    def query(self, sql, params=()):
+        return self.connection.execute(sql, params).fetchall()
+
+    # Function to count the students matching the filters and an extra condition
+    def count(self, condition="", condition_params=(), **criteria):
+        where, params = self.where_condition(condition, condition_params, **criteria)
+        return self.query(f"SELECT COUNT(*) FROM students{where}", params)[0][0]
+
+    # Function to get the smallest and largest value of a column
+    def column_range(self, column):
+        return self.query(f"SELECT MIN({quoted(column)}), MAX({quoted(column)}) FROM students")[0]
+
+    # Function to list the distinct school names
+    def school_names(self):
+        return [school for school, in self.query("SELECT DISTINCT school FROM students ORDER BY school")]
+
+    # Function to count each score of one subject among the students matching the filters
+    def score_counts(self, subject, **criteria):
+        where, params = self.where(**criteria)
+        counts = np.zeros(score_values, dtype=np.int64)
+        for score, count in self.query(f"SELECT {quoted(subject)}, COUNT(*) FROM students{where} GROUP BY 1", params):
+            if score is not None:
+                counts[score] = count
+        return counts
+
+    # Function to compute per-subject score statistics, in the shape of
+    # AggregateStore.subject_analysis
+    def subject_analysis(self, **criteria):
+        values = np.arange(score_values)
+        subject_data = {}
+        for subject in self.subjects:
+            counts = self.score_counts(subject, **criteria)
+            if counts.any():
+                subject_data[subject] = {"scores": values, "weights": counts, **histogram_summary(values, counts)}
+        return subject_data
+
+    # Function to compute overall score statistics per grade, in the shape of
+    # AggregateStore.grade_comparison
+    def grade_comparison(self, **criteria):
+        where, params = self.where_condition("scored > 0", **criteria)
+        subject_count = len(self.subjects)
+        histograms = {}
+        for grade, scored, total, count in self.query(f'SELECT "Grade", scored, total, COUNT(*) FROM students{where} GROUP BY 1, 2, 3', params):
+            counts = histograms.setdefault(grade, np.zeros(subject_count * (100 * subject_count + 1), dtype=np.int64))
+            counts[overall_bins(total, scored, subject_count)] = count
+        return {grade: overall_summary(counts, subject_count) for grade, counts in sorted(histograms.items())}
+
+    # Function to count the students passing every subject of each pathway
+    def pathway_counts(self, pathways, thresholds=None, **criteria):
+        thresholds = thresholds or {}
+        where, params = self.where(**criteria)
+        sums = []
+        for pathway, subjects in pathways.items():
+            threshold = int(thresholds.get(pathway, default_threshold))
+            sums.append("SUM(" + " AND ".join(f"{quoted(subject)} >= {threshold}" for subject in subjects) + ")")
+        counts = self.query(f"SELECT {', '.join(sums)} FROM students{where}", params)[0]
+        return {pathway: count or 0 for pathway, count in zip(pathways, counts)}
+
+    # Function to fetch students matching an extra condition as an in-memory
+    # dataset, in the given order and at most limit of them
+    def students(self, condition="", condition_params=(), order="id", limit=None, offset=0, **criteria):
+        where, params = self.where_condition(condition, condition_params, **criteria)
+        sql = f"SELECT * FROM students{where} ORDER BY {order}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+        frame = pd.read_sql_query(sql, self.connection, params=params)
+        frame = frame.rename(columns={"name": "Name", "school": "School"})
+        return StudentDataset.from_frame(frame, self.subjects), frame["id"].to_numpy()
+
+    # Function to get a student's competition rank and percentile rank within
+    # their grade over the whole database, as the Grade Rank and Grade
+    # Percentile columns give them, from their score total and subjects scored.
+    # Overall scores are compared exactly by cross-multiplying the totals; a
+    # student with no scores is not ranked (rank 0).
+    def grade_rank(self, grade, total, scored):
+        if scored == 0:
+            return 0, float("nan")
+        size, above, tied = self.query(
+            'SELECT COUNT(*), SUM(total * ? > ? * scored), SUM(total * ? = ? * scored) FROM students WHERE "Grade" = ? AND scored > 0',
+            (int(scored), int(total), int(scored), int(total), int(grade)),
+        )[0]
+        below = size - above - tied
+        return above + 1, 100 * (below + tied / 2) / size
+
+    # Function to get the percentile rank of each of a student's subject scores
+    # among the students matching the filters, None for a missing score
+    def subject_percentiles(self, scores, **criteria):
+        values = np.arange(score_values)
+        return {
+            subject: None if score == missing_score else histogram_percentile(values, self.score_counts(subject, **criteria), score)
+            for subject, score in zip(self.subjects, scores)
+        }
+
+    # Function to list the problem cells found while loading, in the shape of
+    # csv_schema.ValidationErrors.to_frame
+    def validation_errors(self):
+        return pd.read_sql_query("SELECT * FROM errors", self.connection)
+
+    # Function to fetch every term of a student, earliest first, through the name index
+    def history(self, name, school):
+        dataset, _ = self.students("name = ? AND school = ?", (name, school), order='"Grade", "Term"')
+        return dataset
+
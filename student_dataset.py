@@ -0,0 +1,221 @@
+import sys
+
+import numpy as np
+
+from packed_strings import PackedStrings
+from ranking import add_rank_columns
+
+# Per-student columns stored next to the score matrix, with their dtypes
+info_columns = {
+    "Age": np.uint8,
+    "Grade": np.uint8,
+    "Term": np.uint8,
+    "Class": np.uint8,
+}
+
+# Scores are whole numbers from 0 to 100. A score that is blank, was blanked as
+# invalid or is in a subject the file does not have is stored as missing_score,
+# and is left out of every statistic rather than counted as 0.
+score_dtype = np.uint8
+missing_score = np.iinfo(score_dtype).max
+
+
+# Function to get which scores are present, as a mask of the same shape
+def present_scores(scores):
+    return scores != missing_score
+
+
+# Function to get scores as floats with the missing ones as NaN, for charts and tables
+def float_scores(scores):
+    return np.where(present_scores(scores), scores, np.nan)
+
+
+# Function to pick the smallest integer dtype that holds codes into count values
+def code_dtype(count):
+    return np.min_scalar_type(max(count - 1, 0))
+
+
+# Function to store a score given as a number or None
+def score_or_missing(score):
+    return missing_score if score is None else score
+
+
+# Function to turn an index array of consecutive rows into the equivalent slice,
+# leaving any other selection as it is
+def as_slice(selection):
+    if (
+        isinstance(selection, np.ndarray) and selection.dtype.kind in "iu" and len(selection)
+        and selection[-1] - selection[0] == len(selection) - 1 and (np.diff(selection) == 1).all()
+    ):
+        return slice(int(selection[0]), int(selection[-1]) + 1)
+    return selection
+
+
+# Columnar student dataset: one row per student, one score column per subject,
+# with missing scores stored as missing_score. Names are packed into a single
+# byte buffer (see PackedStrings) and schools are stored as the smallest integer
+# codes into school_names. Besides the info columns, columns holds each student's
+# Overall mean of their present scores and Grade Rank and Grade Percentile,
+# computed once when the dataset is built; a subset taken from it keeps the ranks
+# from the full cohort.
+class StudentDataset:
+    def __init__(self, subjects, scores, columns, names, school_codes, school_names):
+        self.subjects = list(subjects)
+        self.scores = scores
+        self.columns = columns
+        self.names = names
+        self.school_codes = school_codes
+        self.school_names = school_names
+
+    # Function to build a dataset from the list-of-dicts student format
+    @classmethod
+    def from_records(cls, students, subjects):
+        scores = np.array(
+            [[score_or_missing(student["Subjects"].get(subject)) for subject in subjects] for student in students],
+            dtype=score_dtype,
+        ).reshape(len(students), len(subjects))
+        columns = {
+            column: np.array([student[column] for student in students], dtype=dtype)
+            for column, dtype in info_columns.items()
+        }
+        names = PackedStrings.from_strings(student["Name"] for student in students)
+        school_names, school_codes = np.unique(
+            np.array([student["School"] for student in students], dtype=object), return_inverse=True
+        )
+        return add_rank_columns(cls(
+            subjects, scores, columns, names, school_codes.astype(code_dtype(len(school_names))), school_names
+        ))
+
+    # Function to build a dataset from a DataFrame with one column per subject
+    @classmethod
+    def from_frame(cls, frame, subjects):
+        builder = StudentDatasetBuilder(subjects)
+        builder.add_frame(frame)
+        return builder.build()
+
+    def __len__(self):
+        return len(self.names)
+
+    # Function to select a subset of students by index array, boolean mask or
+    # slice. Consecutive rows are taken as a slice, so the subset is a view
+    # sharing this dataset's arrays instead of a copy.
+    def take(self, selection):
+        selection = as_slice(selection)
+        return StudentDataset(
+            self.subjects,
+            self.scores[selection],
+            {column: values[selection] for column, values in self.columns.items()},
+            self.names[selection],
+            self.school_codes[selection],
+            self.school_names,
+        )
+
+    # Function to join datasets' rows in order, merging their school codes and
+    # ranking the students against the combined cohort once
+    @classmethod
+    def concatenate(cls, datasets):
+        lookup = {}
+        school_codes = []
+        for dataset in datasets:
+            remap = np.array([lookup.setdefault(school, len(lookup)) for school in dataset.school_names], dtype=np.int64)
+            school_codes.append(remap[dataset.school_codes] if len(remap) else dataset.school_codes)
+        return add_rank_columns(cls(
+            datasets[0].subjects,
+            np.concatenate([dataset.scores for dataset in datasets]),
+            {column: np.concatenate([dataset.columns[column] for dataset in datasets]) for column in info_columns},
+            PackedStrings.concatenate(dataset.names for dataset in datasets),
+            np.concatenate(school_codes).astype(code_dtype(len(lookup))),
+            np.array(list(lookup), dtype=object),
+        ))
+
+    # Function to join another dataset's rows after this one's
+    def append(self, other):
+        return StudentDataset.concatenate([self, other])
+
+    # Function to sum each student's present scores, returning the totals and the
+    # number of subjects each student has a score in. The plain row sums are
+    # corrected for the missing scores, which are only counted when there are any.
+    def score_totals(self):
+        totals = self.scores.sum(axis=1, dtype=np.int64)
+        missing = self.scores == missing_score
+        if not missing.any():
+            return totals, np.full(len(totals), len(self.subjects))
+        counts = missing.sum(axis=1)
+        return totals - counts * int(missing_score), len(self.subjects) - counts
+
+    # Function to look up the code of a school, or -1 if it is not in the dataset
+    def school_code(self, school):
+        matches = np.flatnonzero(self.school_names == school)
+        return int(matches[0]) if len(matches) else -1
+
+    # Function to report the bytes held by each part of the dataset
+    def memory_usage(self):
+        return {
+            "scores": self.scores.nbytes,
+            "columns": sum(values.nbytes for values in self.columns.values()),
+            "names": self.names.nbytes,
+            "schools": self.school_codes.nbytes + sum(sys.getsizeof(school) for school in self.school_names),
+        }
+
+    # Function to rebuild a single student in the original dict format, with None
+    # for a missing score
+    def record(self, index):
+        return {
+            "Name": self.names[index],
+            "Subjects": {
+                subject: None if score == missing_score else int(score)
+                for subject, score in zip(self.subjects, self.scores[index].tolist())
+            },
+            **{column: int(self.columns[column][index]) for column in info_columns},
+            "School": self.school_names[self.school_codes[index]],
+        }
+
+
+# Assembles a dataset from DataFrames added one chunk at a time. Each chunk is
+# converted to compact arrays straight away, so only those are kept between chunks.
+class StudentDatasetBuilder:
+    def __init__(self, subjects):
+        self.subjects = list(subjects)
+        self.school_lookup = {}
+        self.parts = {"scores": [], "names": [], "school_codes": [], **{column: [] for column in info_columns}}
+
+    def __len__(self):
+        return sum(len(names) for names in self.parts["names"])
+
+    # Function to convert one DataFrame chunk and append it to the dataset
+    def add_frame(self, frame):
+        scores = np.full((len(frame), len(self.subjects)), missing_score, dtype=score_dtype)
+        for j, subject in enumerate(self.subjects):
+            if subject in frame.columns:
+                scores[:, j] = frame[subject].fillna(missing_score).to_numpy(dtype=score_dtype)
+        self.parts["scores"].append(scores)
+        for column, dtype in info_columns.items():
+            self.parts[column].append(frame[column].fillna(0).to_numpy(dtype=dtype))
+        self.parts["names"].append(PackedStrings.from_strings(frame["Name"].fillna("").tolist()))
+
+        # Map this chunk's school categories onto codes shared by all chunks;
+        # a missing school becomes the empty string
+        schools = frame["School"].astype("category")
+        if schools.isna().any():
+            if "" not in schools.cat.categories:
+                schools = schools.cat.add_categories("")
+            schools = schools.fillna("")
+        lookup = np.array(
+            [self.school_lookup.setdefault(school, len(self.school_lookup)) for school in schools.cat.categories],
+            dtype=np.int32,
+        )
+        self.parts["school_codes"].append(lookup[schools.cat.codes.to_numpy()])
+
+    # Function to join the converted chunks into one dataset
+    def build(self):
+        names = PackedStrings.concatenate(self.parts.pop("names"))
+        arrays = {key: np.concatenate(self.parts.pop(key)) for key in list(self.parts)}
+        school_names = np.array(list(self.school_lookup), dtype=object)
+        return add_rank_columns(StudentDataset(
+            self.subjects,
+            arrays["scores"],
+            {column: arrays[column] for column in info_columns},
+            names,
+            arrays["school_codes"].astype(code_dtype(len(school_names))),
+            school_names,
+        ))
@@ -0,0 +1,80 @@
+import numpy as np
+
+# Columns that get a sorted index for range queries
+range_columns = ("Age", "Grade")
+
+
+# Function to test which values lie in [low, high], where either bound may be None
+def in_range(values, low, high):
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+# Sorted indexes on Age and Grade and a hash index on School, built once per dataset.
+# A query starts from the most selective index and checks the remaining predicates
+# on those candidate rows only, in one combined mask.
+class FilterIndex:
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.sorted = {}
+        for column in range_columns:
+            order = np.argsort(dataset.columns[column], kind="stable")
+            self.sorted[column] = (order, dataset.columns[column][order])
+
+        order = np.argsort(dataset.school_codes, kind="stable")
+        codes, starts = np.unique(dataset.school_codes[order], return_index=True)
+        self.school_rows = {int(code): rows for code, rows in zip(codes, np.split(order, starts[1:]))}
+
+    # Function to get the rows whose column value lies in [low, high] from the sorted index
+    def range_rows(self, column, low, high):
+        order, values = self.sorted[column]
+        start = 0 if low is None else np.searchsorted(values, low, side="left")
+        stop = len(values) if high is None else np.searchsorted(values, high, side="right")
+        return order[start:stop]
+
+    # Function to get the rows of one school from the hash index
+    def school_rows_for(self, school):
+        return self.school_rows.get(self.dataset.school_code(school), np.zeros(0, dtype=np.intp))
+
+    # Function to find the sorted row indices matching every given criterion
+    def query(self, min_age=None, max_age=None, min_grade=None, max_grade=None, school=None):
+        columns = self.dataset.columns
+        candidates = []
+        if min_age is not None or max_age is not None:
+            candidates.append((
+                self.range_rows("Age", min_age, max_age),
+                lambda rows: in_range(columns["Age"][rows], min_age, max_age),
+            ))
+        if min_grade is not None or max_grade is not None:
+            candidates.append((
+                self.range_rows("Grade", min_grade, max_grade),
+                lambda rows: in_range(columns["Grade"][rows], min_grade, max_grade),
+            ))
+        if school and school != "All":
+            code = self.dataset.school_code(school)
+            candidates.append((self.school_rows_for(school), lambda rows: self.dataset.school_codes[rows] == code))
+
+        # Drop criteria that match every student; they cannot narrow the result
+        candidates = [candidate for candidate in candidates if len(candidate[0]) < len(self.dataset)]
+        if not candidates:
+            return None
+
+        # Put the most selective candidate rows back in dataset order by scattering
+        # them into a bitmap, which is cheaper than sorting large selections
+        candidates.sort(key=lambda candidate: len(candidate[0]))
+        selected = np.zeros(len(self.dataset), dtype=bool)
+        selected[candidates[0][0]] = True
+        rows = np.flatnonzero(selected)
+        mask = np.ones(len(rows), dtype=bool)
+        for _, predicate in candidates[1:]:
+            mask &= predicate(rows)
+        return rows[mask]
+
+    # Function to get the filtered dataset, or the dataset itself when nothing is filtered out
+    def filter(self, **criteria):
+        rows = self.query(**criteria)
+        return self.dataset if rows is None else self.dataset.take(rows)
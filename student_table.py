@@ -0,0 +1,193 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from charts import radar_figure, radar_grid_figure, reference_band
+from student_database import quoted
+from student_dataset import float_scores
+from timing_spans import record_figure, timed
+
+# Students per page in the radar drilldowns
+radar_page_size = 24
+radar_individual_page_size = 5
+
+# Students per page of a student table
+student_table_page_size = 50
+
+# Database columns holding the table columns not stored under their own name
+database_columns = {"Name": "name", "School": "school", "Overall": "overall"}
+
+
+# Function to get one table column for the given rows of a dataset, with missing
+# subject scores as NaN
+def column_values(dataset, column, rows):
+    if column == "Name":
+        return np.array(dataset.names.take(rows).tolist(), dtype=object)
+    if column == "School":
+        return dataset.school_names[dataset.school_codes[rows]]
+    if column in dataset.subjects:
+        return float_scores(dataset.scores[rows, dataset.subjects.index(column)])
+    return dataset.columns[column][rows]
+
+
+# Function to build the DataFrame shown for the given rows of a dataset
+def table_frame(dataset, rows, columns):
+    frame = pd.DataFrame({column: column_values(dataset, column, rows) for column in columns})
+    # Widen float32 columns such as Overall, so they round to two decimals exactly
+    return frame.astype({column: np.float64 for column in frame.select_dtypes(np.float32)}).round(2)
+
+
+# Function to get the order that sorts values, largest first when descending.
+# Equal values keep their list order either way, and missing values (NaN) come
+# last, as DatabaseStudentTable orders them.
+def sort_order(values, descending=False):
+    if values.dtype.kind == "f" and np.isnan(values).any():
+        missing = np.isnan(values)
+        present = np.flatnonzero(~missing)
+        return np.concatenate([present[sort_order(values[present], descending)], np.flatnonzero(missing)])
+    if not descending:
+        return np.argsort(values, kind="stable")
+    return (len(values) - 1 - np.argsort(values[::-1], kind="stable"))[::-1]
+
+
+# A list of students of an in-memory dataset shown as a table. Searching and
+# sorting run over the whole list with vectorised operations and only the rows
+# of the requested page are turned into a DataFrame. The last search and the
+# last ordering are kept, so moving between pages does not redo them.
+class StudentTable:
+    def __init__(self, dataset, rows, columns):
+        self.dataset = dataset
+        self.rows = np.asarray(rows)
+        self.columns = list(columns)
+        self.searched = None
+        self.ordered = None
+
+    # Function to get the rows whose name contains the search text, ignoring case
+    def matching(self, search=""):
+        if self.searched is None or self.searched[0] != search:
+            rows = self.rows
+            if search:
+                names = pd.Series(column_values(self.dataset, "Name", rows), dtype=object)
+                rows = rows[names.str.contains(search, case=False, regex=False).to_numpy(dtype=bool)]
+            self.searched = search, rows
+        return self.searched[1]
+
+    # Function to count the students whose name contains the search text
+    def count(self, search=""):
+        return len(self.matching(search))
+
+    # Function to get one page of the matching students, sorted by a column or in list order
+    def page(self, search="", sort=None, descending=False, start=0, size=None):
+        key = (search, sort, descending)
+        if self.ordered is None or self.ordered[0] != key:
+            rows = self.matching(search)
+            if sort is not None:
+                rows = rows[sort_order(column_values(self.dataset, sort, rows), descending)]
+            self.ordered = key, rows
+        stop = None if size is None else start + size
+        return table_frame(self.dataset, self.ordered[1][start:stop], self.columns)
+
+
+# A list of students matching a condition in the database shown as a table.
+# Searching, sorting and paging are done by the queries, so only one page of
+# students is read from the database.
+class DatabaseStudentTable:
+    def __init__(self, database, columns, condition="", condition_params=(), order="id", criteria=None):
+        self.database = database
+        self.columns = list(columns)
+        self.condition = condition
+        self.condition_params = list(condition_params)
+        self.order = order
+        self.criteria = criteria or {}
+
+    # Function to add the name search to the list's condition
+    def search_condition(self, search):
+        if not search:
+            return self.condition, self.condition_params
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        condition = " AND ".join(part for part in (self.condition, "name LIKE ? ESCAPE '\\'") if part)
+        return condition, self.condition_params + [pattern]
+
+    # Function to count the students whose name contains the search text, ignoring case
+    def count(self, search=""):
+        return self.database.count(*self.search_condition(search), **self.criteria)
+
+    # Function to get one page of the matching students, sorted by a column or in list order
+    def page(self, search="", sort=None, descending=False, start=0, size=None):
+        order = self.order
+        if sort is not None:
+            column = quoted(database_columns.get(sort, sort))
+            order = f"{column} IS NULL, {column}{' DESC' if descending else ''}, id"
+        students, _ = self.database.students(*self.search_condition(search), order, size, start, **self.criteria)
+        return table_frame(students, np.arange(len(students)), self.columns)
+
+
+# Function to display a figure, counting it in the open timing spans
+def show_chart(fig):
+    record_figure(fig)
+    st.plotly_chart(fig)
+
+
+# Function to get the table of a list of in-memory students, kept in the session
+# so its search and ordering are reused while the list stays the same
+def dataset_table(key, dataset, rows, columns):
+    table = st.session_state.get(f"{key} table")
+    if table is None or table.rows is not rows or table.columns != list(columns):
+        table = st.session_state[f"{key} table"] = StudentTable(dataset, rows, columns)
+    return table
+
+
+# Function to show a list of students as one table. Searching, sorting and paging
+# run on the server and only the current page is sent to the browser, so the
+# table costs the same however many students it lists.
+@timed()
+def show_student_table(table, key):
+    search_column, sort_column, order_column = st.columns([2, 2, 1])
+    search = search_column.text_input("Search by name", key=f"{key} search")
+    sort = sort_column.selectbox("Sort by", ["List order"] + table.columns, key=f"{key} sort")
+    descending = order_column.checkbox("Descending", key=f"{key} descending")
+    total = table.count(search)
+    if total == 0:
+        st.write("No students to show.")
+        return
+    page_count = -(-total // student_table_page_size)
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count:,}):", 1, page_count, 1, key=f"{key} table page {page_count}")
+    start = (page - 1) * student_table_page_size
+    frame = table.page(search, None if sort == "List order" else sort, descending, start, student_table_page_size)
+    st.dataframe(frame, hide_index=True)
+    st.caption(f"Students {start + 1:,} to {start + len(frame):,} of {total:,}")
+
+
+# Function to generate and display a student's radar chart
+@timed(lambda result, student, *args, **kwargs: 1)
+def generate_radar_chart(student, subjects, title, reference=None):
+    show_chart(radar_figure(student, subjects, title, reference))
+
+
+# Function to show a paginated radar drilldown for a list of students. Only the
+# current page is rendered, either as one small-multiples figure or as
+# individual charts, so render time does not grow with the cohort.
+@timed(lambda result, dataset, rows, cohort_rows, label: len(rows))
+def generate_radar_drilldown(dataset, rows, cohort_rows, label):
+    if len(rows) == 0:
+        st.write("No students to show.")
+        return
+
+    mode = st.radio("Radar view:", ("Small multiples", "Individual charts"), horizontal=True, key=f"{label} view")
+    show_bands = st.checkbox("Overlay cohort mean and percentile band", key=f"{label} bands")
+    page_size = radar_page_size if mode == "Small multiples" else radar_individual_page_size
+    page_count = -(-len(rows) // page_size)
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count}):", 1, page_count, 1, key=f"{label} page")
+    page_rows = rows[(page - 1) * page_size:page * page_size]
+
+    reference = reference_band(dataset.scores[cohort_rows]) if show_bands else None
+    if mode == "Small multiples":
+        show_chart(radar_grid_figure(dataset, page_rows, reference))
+    else:
+        for row in page_rows:
+            student = dataset.record(row)
+            generate_radar_chart(student, dataset.subjects, f"{label} - {student['Name']}", reference)
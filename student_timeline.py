@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from ranking import add_rank_columns
+
+# Terms in a school year, used to number (Grade, Term) as consecutive periods
+terms_per_year = 3
+
+
+# Function to number each row's (Grade, Term) so that consecutive terms differ by one
+def term_periods(dataset):
+    return dataset.columns["Grade"].astype(np.int32) * terms_per_year + dataset.columns["Term"]
+
+
+# Function to give every row the id of its student. Students are identified by
+# their school and name, so the same student gets the same id in every term and
+# every file; ids are numbered 0, 1, 2, ... in order of first appearance.
+def student_ids(dataset):
+    name_codes, name_count = dataset.names.factorize()
+    keys = dataset.school_codes.astype(np.int64) * max(name_count, 1) + name_codes
+    return pd.factorize(keys)[0]
+
+
+# Function to drop rows that another file also has for the same student and term,
+# keeping the ones from the last file, and re-rank the rest. files gives each row's
+# file number; rows repeated within one file are kept, since names are not unique
+# within a school.
+def deduplicate(dataset, files):
+    keys = student_ids(dataset).astype(np.int64) * 1024 + term_periods(dataset)
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    starts = np.flatnonzero(np.append(True, sorted_keys[1:] != sorted_keys[:-1]))
+    last_file = np.maximum.reduceat(files[order], starts)
+    group_sizes = np.diff(np.append(starts, len(order)))
+    keep = np.empty(len(order), dtype=bool)
+    keep[order] = files[order] == np.repeat(last_file, group_sizes)
+    return dataset if keep.all() else add_rank_columns(dataset.take(np.flatnonzero(keep)))
+
+
+# Every student's rows in term order, grouped so that one student's history is a
+# single slice found from their id in O(1), instead of a scan over all rows
+class StudentTimeline:
+    def __init__(self, dataset):
+        self.ids = student_ids(dataset)
+        self.periods = term_periods(dataset)
+        self.order = np.lexsort((self.periods, self.ids))
+        student_count = int(self.ids.max()) + 1 if len(self.ids) else 0
+        self.starts = np.searchsorted(self.ids[self.order], np.arange(student_count + 1))
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    # Function to get a student's rows, earliest term first, from any one of their rows
+    def history(self, row):
+        student = self.ids[row]
+        return self.order[self.starts[student]:self.starts[student + 1]]
+
+    # Function to pair each row with the same student's row in the following term.
+    # Returns (current rows, next rows).
+    def next_term_pairs(self):
+        ids, periods = self.ids[self.order], self.periods[self.order]
+        keep = (ids[1:] == ids[:-1]) & (periods[1:] == periods[:-1] + 1)
+        return self.order[:-1][keep], self.order[1:][keep]
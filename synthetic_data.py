@@ -0,0 +1,116 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+from faker import Faker
+
+from reports import subjects
+from student_dataset import StudentDatasetBuilder
+
+# Sizes of the pre-generated name and school pools students are drawn from
+name_pool_size = 5000
+school_pool_size = 200
+
+# Rows generated per chunk when streaming to disk
+chunk_rows = 1_000_000
+
+
+# Function to pre-generate the pools of student names and school names for a seed
+def generate_pools(seed):
+    fake = Faker()
+    fake.seed_instance(seed)
+    names = np.array([fake.name() for _ in range(name_pool_size)], dtype=object)
+    schools = np.array(sorted({fake.company() for _ in range(school_pool_size)}), dtype=object)
+    return names, schools
+
+
+# Function to generate one chunk of students as a DataFrame. Each chunk has its
+# own random stream derived from the seed, so any chunk can be regenerated alone.
+def generate_chunk(count, seed, chunk_index, pools, subjects=subjects):
+    rng = np.random.default_rng([seed, chunk_index])
+    names, schools = pools
+    frame = {"Name": names[rng.integers(0, len(names), count)]}
+    frame.update({subject: rng.integers(50, 101, count, dtype=np.uint8) for subject in subjects})
+    frame["Age"] = rng.integers(12, 19, count, dtype=np.uint8)
+    frame["Grade"] = rng.integers(8, 13, count, dtype=np.uint8)
+    frame["Term"] = rng.integers(1, 4, count, dtype=np.uint8)
+    frame["Class"] = rng.integers(1, 6, count, dtype=np.uint8)
+    frame["School"] = pd.Categorical.from_codes(rng.integers(0, len(schools), count), categories=schools)
+    return pd.DataFrame(frame)
+
+
+# Function to generate count students chunk by chunk
+def generate_chunks(count, seed=0, subjects=subjects, chunk_rows=chunk_rows):
+    pools = generate_pools(seed)
+    for chunk_index, start in enumerate(range(0, count, chunk_rows)):
+        yield generate_chunk(min(chunk_rows, count - start), seed, chunk_index, pools, subjects)
+
+
+# Function to generate count students straight into a columnar dataset
+def generate_dataset(count, seed=0, subjects=subjects, chunk_rows=chunk_rows):
+    builder = StudentDatasetBuilder(subjects)
+    for chunk in generate_chunks(count, seed, subjects, chunk_rows):
+        builder.add_frame(chunk)
+    return builder.build()
+
+
+# Function to generate count students followed over several consecutive terms.
+# Each term's scores drift from the previous term's, so term-to-term
+# transitions can be learned from the result.
+def generate_history(count, terms=3, seed=0, subjects=subjects):
+    pools = generate_pools(seed)
+    frame = generate_chunk(count, seed, 0, pools, subjects)
+    frame["Term"] = np.uint8(1)
+    builder = StudentDatasetBuilder(subjects)
+    builder.add_frame(frame)
+    for term in range(2, terms + 1):
+        rng = np.random.default_rng([seed, 0, term])
+        frame = frame.copy()
+        for subject in subjects:
+            drift = rng.normal(1.0, 5.0, count)
+            frame[subject] = np.clip(frame[subject] + drift, 0, 100).round().astype(np.uint8)
+        frame["Term"] = np.uint8(term)
+        builder.add_frame(frame)
+    return builder.build()
+
+
+# Function to stream count generated students to a CSV file
+def write_csv(path, count, seed=0, subjects=subjects, chunk_rows=chunk_rows):
+    with open(path, "w", newline="") as output:
+        for chunk_index, chunk in enumerate(generate_chunks(count, seed, subjects, chunk_rows)):
+            chunk.to_csv(output, index=False, header=chunk_index == 0)
+
+
+# Function to stream count generated students to a Parquet file (requires pyarrow)
+def write_parquet(path, count, seed=0, subjects=subjects, chunk_rows=chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in generate_chunks(count, seed, subjects, chunk_rows):
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic student data for load testing.")
+    parser.add_argument("count", type=int, help="number of students to generate")
+    parser.add_argument("output", help="output file, .csv or .parquet")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.splitext(args.output)[1].lower() == ".parquet":
+        write_parquet(args.output, args.count, args.seed)
+    else:
+        write_csv(args.output, args.count, args.seed)
+
+
+if __name__ == "__main__":
+    main()
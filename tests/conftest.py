@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# The modules sit at the top of the repository rather than in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dataset_cache
+from reports import subjects
+from synthetic_data import generate_dataset, write_csv
+
+# Students in the synthetic dataset the tests run on, and how many chunks the
+# CSV tests read a file in, so the readers cross chunk boundaries
+test_students = 2_000
+test_chunks = 8
+
+
+# Keep whatever the loaders cache under the test's temporary directory
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_cache, "cache_dir", str(tmp_path / "cache"))
+    return dataset_cache.cache_dir
+
+
+@pytest.fixture(scope="session")
+def dataset():
+    return generate_dataset(test_students, 0, subjects)
+
+
+# The dataset written as a wide-layout CSV, as bytes
+@pytest.fixture(scope="session")
+def csv_data(tmp_path_factory):
+    path = tmp_path_factory.mktemp("data") / "students.csv"
+    write_csv(path, test_students, 0, subjects)
+    return path.read_bytes()
+
+
+@pytest.fixture
+def chunk_rows():
+    return test_students // test_chunks
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from aggregate_store import build_aggregate_store, report_quantiles
+from benchmark import dict_grade_comparison, dict_subject_analysis, generate_students
+from reports import subjects
+from student_dataset import StudentDataset
+
+
+# The store gives the report numbers without the student rows
+def test_store_matches_dict_reports():
+    students = generate_students(2_000)
+    store = build_aggregate_store(StudentDataset.from_records(students, subjects))
+
+    expected = dict_subject_analysis(students)
+    for subject, summary in store.subject_analysis().items():
+        average, minimum, maximum = expected[subject]
+        assert summary["average"] == pytest.approx(average, abs=1e-9)
+        assert (summary["min"], summary["max"]) == (minimum, maximum)
+
+    expected = dict_grade_comparison(students)
+    for grade, summary in store.grade_comparison().items():
+        average, minimum, maximum, at_risk, excelling = expected[grade]
+        assert summary["average"] == pytest.approx(average, abs=1e-9)
+        # Minimum and maximum are float32 overall means
+        assert summary["min"] == pytest.approx(minimum, abs=1e-4)
+        assert summary["max"] == pytest.approx(maximum, abs=1e-4)
+
+
+# The store's merged quantiles and percentile ranks equal the exact ones computed
+# from the students, over random school and grade filters
+def test_store_quantiles_match_exact(dataset):
+    store = build_aggregate_store(dataset)
+    rng = np.random.default_rng(0)
+    for _ in range(20):
+        school = str(rng.choice(dataset.school_names)) if rng.random() < 0.5 else None
+        low, high = sorted(rng.integers(8, 13, 2).tolist())
+        rows = (dataset.columns["Grade"] >= low) & (dataset.columns["Grade"] <= high)
+        if school is not None:
+            rows &= dataset.school_codes == dataset.school_code(school)
+        scores = dataset.scores[rows]
+        if len(scores) == 0:
+            continue
+        cells = store.select(school, low, high)
+        student = scores[0]
+        percentiles = store.subject_percentiles(cells, student)
+        for j, (subject, summary) in enumerate(store.subject_analysis(cells).items()):
+            exact = np.quantile(scores[:, j], report_quantiles, method="inverted_cdf")
+            assert summary["quartiles"] == exact.tolist()
+            below, tied = (scores[:, j] < student[j]).sum(), (scores[:, j] == student[j]).sum()
+            assert percentiles[subject] == pytest.approx(100 * (below + tied / 2) / len(scores), abs=1e-9)
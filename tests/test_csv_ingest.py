@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from csv_ingest import load_csv
+from csv_schema import ValidationErrors, student_key
+from report_benchmarks import invalid_csv, invalid_rows, long_frame
+from student_dataset import info_columns, missing_score
+
+
+# A score given as text is read as blank and reported with its file line, even
+# when the reader only falls back to text in a later chunk
+def test_invalid_cells(dataset, csv_data, chunk_rows):
+    errors = ValidationErrors()
+    loaded = load_csv(io.BytesIO(invalid_csv(csv_data, dataset.subjects)), dataset.subjects, chunk_rows, errors=errors)
+
+    rows = invalid_rows(len(dataset))
+    expected = np.array(dataset.scores)
+    expected[rows, -1] = missing_score
+    assert np.array_equal(loaded.scores, expected)
+    assert all(np.array_equal(loaded.columns[column], dataset.columns[column]) for column in info_columns)
+    report = errors.to_frame()
+    assert len(errors) == len(report) == len(rows)
+    assert report["Line"].tolist() == (rows + 2).tolist()
+    assert set(report["Column"]) == {dataset.subjects[-1]}
+    assert set(report["Error"]) == {"not a number"}
+
+
+# A long-layout file is pivoted the way a plain pandas pivot places each
+# student's last score, with the unknown subjects and repeated scores reported
+def test_long_layout(dataset, csv_data, chunk_rows):
+    long = long_frame(csv_data, dataset.subjects)
+    errors = ValidationErrors()
+    loaded = load_csv(io.BytesIO(long.to_csv(index=False).encode()), dataset.subjects, chunk_rows, errors=errors)
+
+    known = long["Subject"].isin(dataset.subjects)
+    repeated = known & long.duplicated([*student_key, "Subject"], keep="last")
+    students = long.groupby(list(student_key), sort=False).ngroup().to_numpy()
+    placed = long[known & ~repeated]
+    expected = np.full((students.max() + 1, len(dataset.subjects)), missing_score, dtype=loaded.scores.dtype)
+    scores = pd.to_numeric(placed["Score"], errors="coerce")
+    present = scores.notna().to_numpy()
+    expected[students[placed.index[present]], placed["Subject"].map(dataset.subjects.index)[present]] = scores[present]
+    assert len(loaded) == len(expected)
+    assert np.array_equal(loaded.scores, expected)
+
+    first_rows = np.unique(students, return_index=True)[1]
+    assert loaded.names.tolist() == long["Name"].to_numpy()[first_rows].tolist()
+    assert all(np.array_equal(loaded.columns[column], long[column].to_numpy()[first_rows]) for column in info_columns)
+
+    report = errors.to_frame()
+    expected_report = sorted(
+        [(len(dataset) + 3, "Score", "not a number")]
+        + [(line, "Subject", "unknown subject") for line in np.flatnonzero(~known) + 2]
+        + [(line, "Subject", "repeated for the student; the last score is used") for line in np.flatnonzero(repeated) + 2]
+    )
+    assert sorted(zip(report["Line"].tolist(), report["Column"], report["Error"])) == expected_report
+
+
+# Blank lines, one of spaces, early in the file and a bad cell in a later chunk:
+# every row loads once and the report gives the bad cell's file line
+def test_blank_lines(dataset, csv_data, chunk_rows):
+    last_subject = dataset.subjects[-1]
+    frame = pd.read_csv(io.BytesIO(csv_data))
+    frame[last_subject] = frame[last_subject].astype(object)
+    bad_row = len(frame) - 1
+    frame.loc[bad_row, last_subject] = "absent"
+    header, body = frame.to_csv(index=False).encode().split(b"\n", 1)
+    lines = body.splitlines(keepends=True)
+    blank_lines = [b"\n", b"   \n", b"\n"]
+    spaced = header + b"\n" + lines[0] + b"".join(blank_lines) + b"".join(lines[1:]) + b"\n"
+
+    errors = ValidationErrors()
+    loaded = load_csv(io.BytesIO(spaced), dataset.subjects, chunk_rows, errors=errors)
+    assert len(loaded) == len(dataset)
+    assert loaded.names.tolist() == dataset.names.tolist()
+    report = errors.to_frame()
+    assert report["Line"].tolist() == [bad_row + 2 + len(blank_lines)]
+    assert report["Value"].tolist() == ["absent"]
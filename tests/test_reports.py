@@ -0,0 +1,53 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate_store import build_aggregate_store
+from benchmark import dict_grade_comparison, dict_pathway_analysis, dict_subject_analysis, generate_students
+from csv_ingest import load_csv
+from reports import compute_grade_comparison, compute_pathway_analysis, compute_subject_analysis, pathways, subjects
+from student_dataset import StudentDataset
+
+
+@pytest.fixture(scope="module")
+def students():
+    return generate_students(2_000)
+
+
+# The columnar reports give the numbers the list-of-dicts reports did
+def test_reports_match_dict_reports(students):
+    dataset = StudentDataset.from_records(students, subjects)
+
+    expected = dict_subject_analysis(students)
+    for subject, summary in compute_subject_analysis(dataset).items():
+        average, minimum, maximum = expected[subject]
+        assert summary["average"] == pytest.approx(average, abs=1e-9)
+        assert (summary["min"], summary["max"]) == (minimum, maximum)
+
+    expected = dict_pathway_analysis(students)
+    for pathway, rows in compute_pathway_analysis(dataset, pathways).items():
+        assert len(rows) == len(expected[pathway])
+
+    expected = dict_grade_comparison(students)
+    for grade, summary in compute_grade_comparison(dataset).items():
+        average, minimum, maximum, at_risk, excelling = expected[grade]
+        # Averages come from the exact integer totals, so they match to rounding
+        assert summary["average"] == pytest.approx(average, abs=1e-9)
+        assert (len(summary["at_risk"]), len(summary["excelling"])) == (len(at_risk), len(excelling))
+
+
+# A grade where every score is blank has no overall scores, so it is left out of
+# the grade statistics, both scanned and aggregated
+def test_blank_grade_left_out(dataset, csv_data, chunk_rows):
+    frame = pd.read_csv(io.BytesIO(csv_data))
+    blank_grade = int(frame["Grade"].iloc[0])
+    frame.loc[frame["Grade"] == blank_grade, dataset.subjects] = np.nan
+    loaded = load_csv(io.BytesIO(frame.to_csv(index=False).encode()), dataset.subjects, chunk_rows)
+
+    expected = compute_grade_comparison(loaded)
+    stored = build_aggregate_store(loaded).grade_comparison()
+    assert blank_grade not in expected
+    assert sorted(stored) == sorted(expected)
+    assert all(stored[grade]["average"] == expected[grade]["average"] for grade in expected)
@@ -0,0 +1,55 @@
+import io
+
+import numpy as np
+import pytest
+
+from csv_ingest import load_csv
+from csv_schema import ValidationErrors
+from report_benchmarks import long_frame
+from reports import compute_grade_comparison, compute_subject_analysis
+from student_database import StudentDatabase, load_database
+from student_dataset import info_columns
+from student_filter import FilterIndex
+
+
+# Function to load CSV data into a database file under directory and open it
+def open_database(data, subjects, directory):
+    path = str(directory / "students.db")
+    load_database([io.BytesIO(data)], subjects, path)
+    return StudentDatabase(path, subjects)
+
+
+# The SQLite backend reports the same figures as the in-memory path, for the
+# whole dataset and for one school
+@pytest.mark.parametrize("one_school", [False, True])
+def test_database_reports_match_memory(dataset, csv_data, tmp_path, one_school):
+    criteria = {"school": str(dataset.school_names[0]), "min_grade": 9, "max_grade": 11} if one_school else {}
+    database = open_database(csv_data, dataset.subjects, tmp_path)
+    subset = FilterIndex(dataset).filter(**criteria)
+
+    stored = database.subject_analysis(**criteria)
+    for subject, summary in compute_subject_analysis(subset).items():
+        for name in ("students", "average", "std", "min", "max", "quartiles"):
+            assert summary[name] == stored[subject][name]
+    stored = database.grade_comparison(**criteria)
+    for grade, summary in compute_grade_comparison(subset).items():
+        for name in ("average", "min", "max", "quartiles"):
+            assert summary[name] == stored[grade][name]
+
+
+# A long-layout file pivoted in SQL loads the same students, in the same order,
+# with the same problem cells as the in-memory pivot
+def test_database_long_layout_matches_memory(dataset, csv_data, chunk_rows, tmp_path):
+    long = long_frame(csv_data, dataset.subjects).to_csv(index=False).encode()
+    errors = ValidationErrors()
+    expected = load_csv(io.BytesIO(long), dataset.subjects, chunk_rows, errors=errors)
+    database = open_database(long, dataset.subjects, tmp_path)
+
+    loaded, _ = database.students()
+    assert loaded.names.tolist() == expected.names.tolist()
+    assert np.array_equal(loaded.scores, expected.scores)
+    assert all(np.array_equal(loaded.columns[column], expected.columns[column]) for column in info_columns)
+
+    columns = ["Line", "Column", "Value", "Error"]
+    stored = database.validation_errors()[columns].astype(str).values.tolist()
+    assert sorted(stored) == sorted(errors.to_frame()[columns].astype(str).values.tolist())
@@ -0,0 +1,209 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+import dataset_cache
+from charts import figure_bytes
+
+# Set SCHOLARSENSE_PROFILE=1 to also trace allocations and measure the serialized
+# size of every figure shown. Both slow a rerun down: tracing makes every
+# allocation slower and measuring serializes each figure a second time.
+profile_details = os.environ.get("SCHOLARSENSE_PROFILE") == "1"
+
+# File the finished spans are appended to, as one JSON object per line, once
+# per run
+timing_log = os.environ.get("SCHOLARSENSE_TIMING_LOG", os.path.join(dataset_cache.cache_dir, "timings.jsonl"))
+
+# Size past which the timing log is moved to timing_log + ".1", replacing the
+# one moved before, so the log takes at most about twice this on disk
+max_log_bytes = int(os.environ.get("SCHOLARSENSE_TIMING_LOG_BYTES", 16 * 1024 ** 2))
+
+# Numbers the runs of this process
+run_numbers = itertools.count(1)
+
+# The run and the open spans of each script thread, and the runs not finished yet
+# by thread
+current = threading.local()
+open_runs = {}
+log_lock = threading.Lock()
+
+
+# Timing of one call: wall and CPU time, the rows it worked on and, while
+# profiling, the peak bytes allocated above the start, the bytes still held at
+# the end (negative when it freed more than it kept) and the figures it showed.
+# A span's totals include the spans opened inside it.
+class Span:
+    def __init__(self, name, parent):
+        self.name = name
+        self.parent = parent
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.rows = None
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.retained = None
+        self.peak = None
+        self.peak_seen = 0
+        self.figures = 0
+        self.figure_bytes = 0
+        self.figure_seconds = 0.0
+
+    # Function to describe the span as a log record
+    def record(self):
+        return {
+            "span": self.name,
+            "parent": None if self.parent is None else self.parent.name,
+            "depth": self.depth,
+            "rows": self.rows,
+            "wall_seconds": round(self.wall, 6),
+            "cpu_seconds": round(self.cpu, 6),
+            "retained_bytes": self.retained,
+            "peak_bytes": self.peak,
+            "figures": self.figures,
+            "figure_bytes": self.figure_bytes if profile_details else None,
+            "figure_seconds": round(self.figure_seconds, 6) if profile_details else None,
+        }
+
+
+# The spans finished during one script run, in the order they finished, with
+# fields (such as the report shown) added to each of their log records
+class RunTimings:
+    def __init__(self, context):
+        self.number = next(run_numbers)
+        self.context = context
+        self.started = time.time()
+        self.spans = []
+
+    # Function to get the seconds since the run started
+    def elapsed(self):
+        return time.time() - self.started
+
+    # Function to list the finished spans in call order, outer spans first
+    def records(self):
+        return sorted((span.record() | {"start": start} for start, span in self.spans), key=lambda record: record["start"])
+
+    # Function to get the log records of the finished spans, in the order they finished
+    def log_records(self):
+        return [{"run": self.number, "time": self.started + start, **self.context, **span.record()} for start, span in self.spans]
+
+
+# Function to start timing a script run in this thread, tracing allocations
+# too while profiling. Spans are only recorded between start_run and finish_run,
+# so the functions cost nothing extra when called outside the app. Allocations
+# are traced process-wide, so they are only exact while one session reruns. A
+# run cut short by a rerun never reaches finish_run, so the spans of runs whose
+# thread has ended or started again are logged here.
+def start_run(**context):
+    this_thread = threading.current_thread()
+    with log_lock:
+        stopped = [thread for thread in open_runs if thread is this_thread or not thread.is_alive()]
+        records = [record for thread in stopped for record in open_runs.pop(thread).log_records()]
+    write_log(records)
+    if profile_details and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    current.run = RunTimings(context)
+    current.stack = []
+    with log_lock:
+        open_runs[this_thread] = current.run
+    return current.run
+
+
+# Function to stop timing this thread's run and log its spans, returning it
+def finish_run():
+    run = getattr(current, "run", None)
+    current.run = None
+    with log_lock:
+        open_runs.pop(threading.current_thread(), None)
+    if run is not None:
+        write_log(run.log_records())
+    return run
+
+
+# Function to append finished spans to the timing log in one write, first
+# rotating the log when it has grown past max_log_bytes
+def write_log(records):
+    if not records:
+        return
+    lines = "".join(json.dumps(record) + "\n" for record in records)
+    with log_lock:
+        os.makedirs(os.path.dirname(os.path.abspath(timing_log)), exist_ok=True)
+        try:
+            if os.path.getsize(timing_log) + len(lines) > max_log_bytes:
+                os.replace(timing_log, timing_log + ".1")
+        except OSError:
+            pass
+        with open(timing_log, "a") as log:
+            log.write(lines)
+
+
+# Function to time the calls of a function as spans named after it. rows, when
+# given, is called with the result and the arguments to count the rows worked on.
+def timed(rows=None, name=None):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            run = getattr(current, "run", None)
+            if run is None:
+                return function(*args, **kwargs)
+            span = Span(name or function.__name__, current.stack[-1] if current.stack else None)
+            current.stack.append(span)
+            tracing = tracemalloc.is_tracing()
+            if tracing:
+                # Fold the peak so far into the parent before resetting it for this span
+                memory, peak = tracemalloc.get_traced_memory()
+                if span.parent is not None:
+                    span.parent.peak_seen = max(span.parent.peak_seen, peak)
+                tracemalloc.reset_peak()
+                span.peak_seen = memory
+            start = time.perf_counter(), time.thread_time()
+            offset = time.time() - run.started
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                span.wall = time.perf_counter() - start[0]
+                span.cpu = time.thread_time() - start[1]
+                if tracing:
+                    end, peak = tracemalloc.get_traced_memory()
+                    span.peak_seen = max(span.peak_seen, peak)
+                    span.retained = end - memory
+                    span.peak = span.peak_seen - memory
+                    if span.parent is not None:
+                        span.parent.peak_seen = max(span.parent.peak_seen, span.peak_seen)
+                current.stack.pop()
+                run.spans.append((offset, span))
+            if rows is not None:
+                span.rows = rows(result, *args, **kwargs)
+            return result
+
+        return wrapper
+
+    return decorate
+
+
+# Function to count a figure shown in every open span, measuring its serialized
+# size and the time Plotly takes to serialize it while profiling
+def record_figure(fig):
+    if getattr(current, "run", None) is None or not current.stack:
+        return
+    size, seconds = 0, 0.0
+    if profile_details:
+        start = time.perf_counter()
+        size = figure_bytes(fig)
+        seconds = time.perf_counter() - start
+    for span in current.stack:
+        span.figures += 1
+        span.figure_bytes += size
+        span.figure_seconds += seconds
+
+
+# Function to count the rows of a call's first argument
+def argument_rows(result, *args, **kwargs):
+    return None if not args or args[0] is None else len(args[0])
+
+
+# Function to count the rows of a call's result
+def result_rows(result, *args, **kwargs):
+    return len(result)